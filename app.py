@@ -11,7 +11,9 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import mysql.connector
 
-from database.connection import get_db_connection
+from database.connection import get_db_connection, init_app as init_db
+from services.cache import flight_stats
+from services.passwords import password_verifier
 
 # -------------------------------------------------------------
 # Flask Initialization
@@ -33,6 +35,10 @@ CORS(
         }
     },
     supports_credentials=True,
+    expose_headers=[
+        "X-Next-Cursor",                                # keyset pagination cursor
+        "X-Capture-Interval", "X-Drop-Non-Critical",    # ingest backpressure hints
+    ],
 )
 
 
@@ -40,6 +46,9 @@ CORS(
 app.config["JWT_SECRET_KEY"] = "supersecretkey"
 jwt = JWTManager(app)
 
+# Pooled DB connections: return anything a request leaves checked out
+init_db(app)
+
 # -------------------------------------------------------------
 # Health Check / Root Route
 # -------------------------------------------------------------
@@ -62,6 +71,16 @@ def test_connection():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# -------------------------------------------------------------
+# Read-path cache / request coalescing / login verification counters
+# -------------------------------------------------------------
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "single_flight": flight_stats(),
+        "password_verifier": password_verifier.stats(),
+    }), 200
+
 # -------------------------------------------------------------
 # Register Blueprints
 # -------------------------------------------------------------
@@ -89,6 +108,7 @@ from routes.utils.email_verification import email_verification_bp
 from routes.exam_question_routes import exam_questions_bp
 from routes.ai_bridge_routes import ai_bridge_bp
 from routes.behavior_sync_routes import behavior_sync_bp
+from routes.heartbeat_routes import heartbeat_bp
 # -------------------------------------------------------------
 # Register Blueprints with URL Prefixes
 # -------------------------------------------------------------
@@ -116,6 +136,21 @@ app.register_blueprint(email_verification_bp, url_prefix="/api")
 app.register_blueprint(exam_questions_bp, url_prefix="/api")
 app.register_blueprint(ai_bridge_bp, url_prefix="/api")
 app.register_blueprint(behavior_sync_bp, url_prefix="/api")
+app.register_blueprint(heartbeat_bp, url_prefix="/api")
+
+# -------------------------------------------------------------
+# Warm caches for exams about to start (services/prewarm.py)
+# -------------------------------------------------------------
+from services.prewarm import PREWARM_ENABLED, prewarm_scheduler
+if PREWARM_ENABLED:
+    prewarm_scheduler.start()
+
+# Grading workers for asynchronous /submit_exam (services/submission_service.py).
+# Started up front only when async is the default; otherwise the first
+# ?async=1 submission starts them.
+from services.submission_service import SUBMIT_ASYNC_DEFAULT, SUBMIT_WORKERS, submission_workers
+if SUBMIT_ASYNC_DEFAULT and SUBMIT_WORKERS > 0:
+    submission_workers.start()
 
 # -------------------------------------------------------------
 # Local Development Entry Point
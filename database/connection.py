@@ -1,12 +1,132 @@
 import os
-import mysql.connector
+import sys
+import time
+import threading
 
-def get_db_connection():
-    connection = mysql.connector.connect(
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from flask import g, has_request_context, request
+
+# -------------------------------------------------------------
+# Pool Configuration
+# -------------------------------------------------------------
+# mysql-connector caps a single pool at 32 connections (pooling.CNX_POOL_MAXSIZE).
+POOL_SIZE = min(int(os.getenv("DB_POOL_SIZE", "10")), pooling.CNX_POOL_MAXSIZE)
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))      # seconds to wait when exhausted
+LEAK_WARN_SECONDS = float(os.getenv("DB_LEAK_WARN_SECONDS", "10"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _db_config():
+    return dict(
         host=os.getenv("DB_HOST", "localhost"),
         port=os.getenv("DB_PORT", "3306"),
         user=os.getenv("DB_USER", "root"),
         password=os.getenv("DB_PASSWORD", ""),
-        database=os.getenv("DB_NAME", "proctorvision_db")
+        database=os.getenv("DB_NAME", "proctorvision_db"),
     )
-    return connection
+
+
+def _get_pool():
+    """
+    Return the pool owned by the current process.
+    Pools are keyed by pid so every gunicorn worker builds its own after fork
+    instead of sharing sockets inherited from the master.
+    """
+    pid = os.getpid()
+    pool = _pools.get(pid)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(pid)
+        if pool is None:
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"proctorvision_{pid}",
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                **_db_config(),
+            )
+            _pools[pid] = pool
+    return pool
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled connection.
+    close() returns it to the pool and is safe to call more than once, so
+    existing `conn.close()` calls in routes and `finally` blocks keep working.
+    """
+
+    def __init__(self, cnx, endpoint=None):
+        self._cnx = cnx
+        self.endpoint = endpoint
+        self.checked_out_at = time.monotonic()
+
+    def __getattr__(self, attr):
+        return getattr(self._cnx, attr)
+
+    @property
+    def closed(self):
+        return self._cnx is None
+
+    def close(self):
+        cnx, self._cnx = self._cnx, None
+        if cnx is not None:
+            held = time.monotonic() - self.checked_out_at
+            if self.endpoint and held > LEAK_WARN_SECONDS:
+                print(
+                    f"[DB_SLOW] endpoint={self.endpoint} held a connection for {held:.2f}s",
+                    file=sys.stderr, flush=True,
+                )
+            cnx.close()
+
+
+def _checkout():
+    """Take a connection from the pool, waiting up to POOL_TIMEOUT if exhausted."""
+    pool = _get_pool()
+    deadline = time.monotonic() + POOL_TIMEOUT
+    while True:
+        try:
+            # get_connection() pings the socket and reconnects stale connections.
+            return pool.get_connection()
+        except PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+def get_db_connection():
+    """
+    Check a connection out of the worker's pool.
+    Inside a request the checkout is tracked so the teardown hook can return
+    anything a route forgot to close and report which endpoint leaked it.
+    """
+    if not has_request_context():
+        return PooledConnection(_checkout())
+
+    conn = PooledConnection(_checkout(), endpoint=request.endpoint)
+    g.setdefault("_db_checkouts", []).append(conn)
+    return conn
+
+
+def _release_request_connections(exc=None):
+    """Teardown hook: return every connection the request still holds."""
+    for conn in g.pop("_db_checkouts", []):
+        if conn.closed:
+            continue
+        held = time.monotonic() - conn.checked_out_at
+        print(
+            f"[DB_LEAK] endpoint={conn.endpoint} held a connection for {held:.2f}s "
+            "without closing it; returned to pool on teardown",
+            file=sys.stderr, flush=True,
+        )
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"[DB_RELEASE_ERR] {e}", file=sys.stderr, flush=True)
+
+
+def init_app(app):
+    app.teardown_appcontext(_release_request_connections)
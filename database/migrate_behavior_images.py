@@ -0,0 +1,64 @@
+# Backfill: move inline image_base64 captures into the blob store.
+# Run from the project root:  python -m database.migrate_behavior_images --batch 500
+import argparse
+import sys
+
+from database.connection import get_db_connection
+from services.behavior_service import decode_image_base64, store_capture_blobs
+
+
+def migrate(batch_size=500, keep_inline=False, limit=None):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    last_id = 0
+    moved = failed = 0
+
+    try:
+        while limit is None or moved + failed < limit:
+            # Keyset scan so each batch is an index range, not an OFFSET walk
+            cursor.execute("""
+                SELECT id, image_base64
+                FROM suspicious_behavior_logs
+                WHERE id > %s AND image_hash IS NULL AND image_base64 IS NOT NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                last_id = row["id"]
+                try:
+                    data, mime = decode_image_base64(row["image_base64"])
+                    updates.append((*store_capture_blobs(data, mime), row["id"]))
+                except ValueError as e:
+                    failed += 1
+                    print(f"⚠️ Skipping log {row['id']}: {e}", file=sys.stderr)
+
+            if updates:
+                clear_inline = "" if keep_inline else ", image_base64 = NULL"
+                cursor.executemany(f"""
+                    UPDATE suspicious_behavior_logs
+                    SET image_hash = %s, image_size = %s, image_mime = %s, thumb_hash = %s{clear_inline}
+                    WHERE id = %s
+                """, updates)
+                conn.commit()
+                moved += len(updates)
+
+            print(f"Migrated {moved} captures (last id {last_id}, {failed} skipped)")
+    finally:
+        cursor.close()
+        conn.close()
+
+    return moved, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move behavior images into the blob store.")
+    parser.add_argument("--batch", type=int, default=500, help="rows per batch")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    parser.add_argument("--keep-inline", action="store_true", help="do not clear image_base64")
+    args = parser.parse_args()
+    migrate(batch_size=args.batch, keep_inline=args.keep_inline, limit=args.limit)
@@ -0,0 +1,19 @@
+# Rebuild behavior_log_counters from suspicious_behavior_logs.
+# Run from the project root:  python -m database.rebuild_behavior_counters [--exam 42]
+import argparse
+
+from database.connection import get_db_connection
+from services.behavior_counters import rebuild_counters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill behavior_log_counters.")
+    parser.add_argument("--exam", type=int, default=None, help="only rebuild this exam")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        rows = rebuild_counters(conn, exam_id=args.exam)
+        print(f"Rebuilt {rows} counter rows" + (f" for exam {args.exam}" if args.exam else ""))
+    finally:
+        conn.close()
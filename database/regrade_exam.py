@@ -0,0 +1,20 @@
+# Regrade every submission of an exam against its current answer key.
+# Run from the project root:  python -m database.regrade_exam 42 [--dry-run]
+import argparse
+
+from services.regrade import regrade_exam
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute exam_answers.is_correct and exam_submissions.score.")
+    parser.add_argument("exam_id", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing them")
+    args = parser.parse_args()
+
+    summary = regrade_exam(args.exam_id, dry_run=args.dry_run)
+    print(
+        f"Exam {summary['exam_id']}: {summary['submissions']} submissions, "
+        f"{summary['answers_changed']}/{summary['answers_checked']} answers and "
+        f"{summary['scores_changed']} scores {'would change' if summary['dry_run'] else 'updated'} "
+        f"in {summary['seconds']}s"
+    )
@@ -1,12 +1,15 @@
 from flask import Blueprint, request, jsonify
-from services.behavior_service import save_behavior_log
-from services.instructor_services import increment_suspicious_for_student
+from services.behavior_service import save_behavior_log_async
+from services.live_state import live_state
+from services.ingest_load import ingest_load
+from routes.utils.backpressure import with_backpressure
 
 ai_bridge_bp = Blueprint("ai_bridge", __name__)
 
 @ai_bridge_bp.route("/save_behavior_log", methods=["POST"])
+@with_backpressure
 def save_behavior_log_api():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
     exam_id = data.get("exam_id")
     image_base64 = data.get("image_base64")
@@ -14,12 +17,22 @@ def save_behavior_log_api():
 
     if not all([user_id, exam_id, image_base64, warning_type]):
         return jsonify({"error": "Missing required fields"}), 400
+    try:
+        user_id, exam_id = int(user_id), int(exam_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "user_id and exam_id must be integers"}), 400
+
+    if ingest_load.should_shed(user_id, exam_id, warning_type):
+        return jsonify({"status": "shed"}), 202
 
+    # Buffered write-behind; a full queue means the DB is falling behind
     try:
-        save_behavior_log(user_id, exam_id, image_base64, warning_type)
-        return jsonify({"status": "ok"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        accepted = save_behavior_log_async(user_id, exam_id, image_base64, warning_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not accepted:
+        return jsonify({"error": "Behavior log queue is full, retry later"}), 503, {"Retry-After": "1"}
+    return jsonify({"status": "ok"})
 
 
 @ai_bridge_bp.route("/increment_suspicious", methods=["POST"])
@@ -30,7 +43,7 @@ def increment_suspicious_api():
         return jsonify({"error": "Missing student_id"}), 400
 
     try:
-        increment_suspicious_for_student(student_id)
+        live_state.increment_suspicious(student_id)
         return jsonify({"status": "ok"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
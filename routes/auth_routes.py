@@ -1,11 +1,29 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, decode_token, get_jwt, jwt_required
 from database.connection import get_db_connection
+from services.live_state import live_state
 from datetime import timedelta
-import bcrypt
+from services.refresh_tokens import (
+    RefreshTokenError, issue_refresh_token, revoke_refresh_token, rotate_refresh_token,
+)
+from services.passwords import password_verifier, needs_rehash, rehash_in_background, VerifierBusy
 
 auth_bp = Blueprint('auth', __name__)
 
+# Admins take precedence over users with the same username
+_LOGIN_LOOKUP = """
+    SELECT * FROM (
+        SELECT 0 AS rank_, 'admin' AS source, id, username, name, password, 'Admin' AS user_type
+        FROM admin WHERE username = %s
+        UNION ALL
+        SELECT 1, 'users', id, username, name, password, user_type
+        FROM users WHERE username = %s
+    ) candidates
+    ORDER BY rank_
+    LIMIT 1
+"""
+
+
 @auth_bp.route("/login", methods=["POST"])
 def login():
     try:
@@ -19,67 +37,109 @@ def login():
         if not username or not password:
             return jsonify({"error": "Username and password are required"}), 400
 
+        # One lookup; the connection goes back to the pool before bcrypt runs
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # === Check Admin Table ===
-        cursor.execute("SELECT * FROM admin WHERE username = %s", (username,))
-        admin = cursor.fetchone()
-        if admin:
-            stored_hash = str(admin['password']).strip()
-            if bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8')):
-                token = create_access_token(
-                    identity=admin['username'],
-                    expires_delta=timedelta(days=1)
-                )
-                return jsonify({
-                    "message": "Login successful",
-                    "username": admin['username'],
-                    "name": admin['name'],
-                    "role": "Admin",
-                    "token": token
-                }), 200
-            else:
-                return jsonify({"error": "Invalid username or password"}), 401
-
-        # === Check Users Table (Instructor / Student) ===
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        if user:
-            stored_hash = str(user['password']).strip()
-            if bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8')):
-                if user['user_type'] == 'Student':
-                    cursor.execute(
-                        "UPDATE instructor_assignments SET is_login = 1 WHERE student_id = %s",
-                        (user['id'],)
-                    )
-                    conn.commit()
-
-                token = create_access_token(
-                    identity=user['username'],
-                    expires_delta=timedelta(days=1)
-                )
-                return jsonify({
-                    "message": "Login successful",
-                    "id": user['id'],
-                    "username": user['username'],
-                    "name": user['name'],
-                    "role": user['user_type'],  # "Instructor" or "Student"
-                    "token": token
-                }), 200
-            else:
-                return jsonify({"error": "Invalid username or password"}), 401
-
-        return jsonify({"error": "Invalid username or password"}), 401
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(_LOGIN_LOOKUP, (username, username))
+            account = cursor.fetchone()
+        finally:
+            conn.close()
+
+        if not account:
+            return jsonify({"error": "Invalid username or password"}), 401
+
+        stored_hash = str(account['password']).strip()
+        try:
+            ok = password_verifier.verify(password, stored_hash)
+        except VerifierBusy:
+            return jsonify({"error": "Server busy. Please try again."}), 503, {"Retry-After": "2"}
+        if not ok:
+            return jsonify({"error": "Invalid username or password"}), 401
+
+        if needs_rehash(stored_hash):
+            rehash_in_background(account['source'], "id", account['id'], password, account['password'])
+
+        token = create_access_token(
+            identity=account['username'],
+            expires_delta=timedelta(days=1)
+        )
+        refresh_token = issue_refresh_token(account['source'], account['id'], account['username'])
+
+        # === Admin ===
+        if account['source'] == 'admin':
+            return jsonify({
+                "message": "Login successful",
+                "username": account['username'],
+                "name": account['name'],
+                "role": "Admin",
+                "token": token,
+                "refresh_token": refresh_token
+            }), 200
+
+        # === Users Table (Instructor / Student) ===
+        if account['user_type'] == 'Student':
+            live_state.set_flags(account['id'], is_login=1)
+
+        return jsonify({
+            "message": "Login successful",
+            "id": account['id'],
+            "username": account['username'],
+            "name": account['name'],
+            "role": account['user_type'],  # "Instructor" or "Student"
+            "token": token,
+            "refresh_token": refresh_token
+        }), 200
 
     except Exception as e:
         print("Login error:", str(e))
         return jsonify({"error": "Server error. Please try again."}), 500
 
-    finally:
-        if 'conn' in locals():
-            conn.close()
-            
+
+# Reconnecting clients trade a refresh token (Authorization: Bearer <token>
+# or {"refresh_token": ...}) for a new access token: one indexed lookup, no bcrypt.
+# The presented token is retired and a new one returned in its place.
+@auth_bp.route("/token/refresh", methods=["POST"])
+@jwt_required(refresh=True, locations=["headers", "json"])
+def refresh_access_token():
+    try:
+        account, refresh_token = rotate_refresh_token(get_jwt()["jti"])
+    except RefreshTokenError as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        print("Token refresh error:", str(e))
+        return jsonify({"error": "Server error. Please try again."}), 500
+
+    if account['user_type'] == 'Student':
+        live_state.set_flags(account['account_id'], is_login=1)
+
+    token = create_access_token(
+        identity=account['username'],
+        expires_delta=timedelta(days=1)
+    )
+    body = {
+        "message": "Token refreshed",
+        "username": account['username'],
+        "name": account['name'],
+        "role": account['user_type'],
+        "token": token,
+        "refresh_token": refresh_token
+    }
+    if account['account_type'] == 'users':
+        body["id"] = account['account_id']
+    return jsonify(body), 200
+
+
+@auth_bp.route("/token/revoke", methods=["POST"])
+@jwt_required(refresh=True, locations=["headers", "json"])
+def revoke_token():
+    try:
+        revoke_refresh_token(get_jwt()["jti"])
+        return jsonify({"message": "Refresh token revoked"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @auth_bp.route("/logout", methods=["POST"])
 def logout():
     try:
@@ -89,17 +149,15 @@ def logout():
         if not student_id:
             return jsonify({"error": "Missing student_id"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE instructor_assignments SET is_login = 0 WHERE student_id = %s",
-            (student_id,)
-        )
-        conn.commit()
+        live_state.set_flags(student_id, is_login=0)
+
+        # Optional: end the refresh-token session as well
+        if req_data.get("refresh_token"):
+            try:
+                revoke_refresh_token(decode_token(req_data["refresh_token"])["jti"])
+            except Exception as e:
+                print("Refresh revoke on logout failed:", str(e))
         return jsonify({"message": "Logout successful"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
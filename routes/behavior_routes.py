@@ -1,22 +1,137 @@
 # routes/behavior_routes.py
+import os
 from flask import Blueprint, request, jsonify
-from services.behavior_service import save_behavior_log
+from services.behavior_service import (
+    save_behavior_log,
+    save_behavior_log_async,
+    save_behavior_capture_async,
+    sniff_mime,
+)
+from services.ingest_load import ingest_load
+from routes.utils.backpressure import with_backpressure
 
 behavior_bp = Blueprint('behavior', __name__)
 
+# Queue /save_behavior_log writes by default instead of only on ?async=1.
+# Queued responses are 202 without a row id, so only enable this once every
+# client has stopped reading "id".
+BEHAVIOR_LOG_ASYNC_DEFAULT = os.getenv("BEHAVIOR_LOG_ASYNC_DEFAULT", "0") == "1"
+
+MAX_FRAME_BYTES = int(os.getenv("BEHAVIOR_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+MAX_FRAMES_PER_REQUEST = int(os.getenv("BEHAVIOR_MAX_FRAMES_PER_REQUEST", "20"))
+# Whole request body: every frame at full size plus multipart overhead
+MAX_FRAMES_BODY_BYTES = int(os.getenv(
+    "BEHAVIOR_MAX_FRAMES_BODY_BYTES",
+    str(MAX_FRAME_BYTES * MAX_FRAMES_PER_REQUEST + 64 * 1024),
+))
+
+# POST /api/save_behavior_log
+#   default: insert now, 201 {"message", "id"} (unchanged contract)
+#   ?async=1 (or "async": true): hand off to the batched flusher, 202
+#   {"message", "queued": true} with no id; may be shed under load.
 @behavior_bp.route('/save_behavior_log', methods=['POST'])
+@with_backpressure
 def save_behavior_log_route():
     data = request.json or {}
     user_id = data.get('user_id')
     exam_id = data.get('exam_id')
     image_base64 = data.get('image_base64')
     warning_type = data.get('warning_type')
+    run_async = request.args.get('async') == '1' or data.get('async') is True
 
     if not all([user_id, exam_id, image_base64, warning_type]):
         return jsonify({"error": "Missing required fields"}), 400
+    try:
+        user_id, exam_id = int(user_id), int(exam_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "user_id and exam_id must be integers"}), 400
 
     try:
-        _id = save_behavior_log(int(user_id), int(exam_id), image_base64, warning_type)
-        return jsonify({"message": "Behavior log saved successfully", "id": _id}), 201
+        if not (BEHAVIOR_LOG_ASYNC_DEFAULT or run_async) or request.args.get('sync') == '1':
+            _id = save_behavior_log(user_id, exam_id, image_base64, warning_type)
+            return jsonify({"message": "Behavior log saved successfully", "id": _id}), 201
+
+        if ingest_load.should_shed(user_id, exam_id, warning_type):
+            return jsonify({"message": "Repeated frame dropped under load", "shed": True, "queued": False}), 202
+        if not save_behavior_log_async(user_id, exam_id, image_base64, warning_type):
+            return jsonify({"error": "Behavior log queue is full, retry later"}), 503, {"Retry-After": "1"}
+        return jsonify({"message": "Behavior log queued", "queued": True}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def _frame_meta(name):
+    """Read upload metadata from form fields, then X-* headers, then the query string."""
+    header = "X-" + "-".join(part.capitalize() for part in name.split("_"))
+    return request.form.get(name) or request.headers.get(header) or request.args.get(name)
+
+
+# POST /api/behavior_frames - raw image bytes, no base64/JSON
+#   multipart/form-data: user_id, exam_id, warning_type + one or more "frames" files
+#                        (optional "warning_types" list aligned with the files)
+#   application/octet-stream or image/*: single frame body, metadata in
+#                        X-User-Id / X-Exam-Id / X-Warning-Type headers or query params
+@behavior_bp.route('/behavior_frames', methods=['POST'])
+@with_backpressure
+def upload_behavior_frames():
+    # Reject oversized bodies before anything is read; the per-request limit
+    # also stops chunked uploads that carry no Content-Length.
+    if request.content_length is not None and request.content_length > MAX_FRAMES_BODY_BYTES:
+        return jsonify({"error": f"Request body exceeds {MAX_FRAMES_BODY_BYTES} bytes"}), 413
+    request.max_content_length = MAX_FRAMES_BODY_BYTES
+
+    user_id = _frame_meta('user_id')
+    exam_id = _frame_meta('exam_id')
+    default_warning = _frame_meta('warning_type')
+
+    if not user_id or not exam_id:
+        return jsonify({"error": "Missing user_id or exam_id"}), 400
+    try:
+        user_id, exam_id = int(user_id), int(exam_id)
+    except ValueError:
+        return jsonify({"error": "user_id and exam_id must be integers"}), 400
+
+    frames = []
+    if request.files:
+        files = request.files.getlist('frames') or request.files.getlist('frame')
+        warning_types = request.form.getlist('warning_types')
+        for i, f in enumerate(files):
+            warning = warning_types[i] if i < len(warning_types) and warning_types[i] else default_warning
+            frames.append((f.read(MAX_FRAME_BYTES + 1), f.mimetype, warning))
+    else:
+        frames.append((request.get_data(cache=False), request.mimetype, default_warning))
+
+    if not frames or not any(data for data, _, _ in frames):
+        return jsonify({"error": "No frames uploaded"}), 400
+    if len(frames) > MAX_FRAMES_PER_REQUEST:
+        return jsonify({"error": f"At most {MAX_FRAMES_PER_REQUEST} frames per request"}), 413
+
+    accepted = shed = 0
+    errors = []
+    for i, (data, mimetype, warning) in enumerate(frames):
+        if not data:
+            errors.append({"index": i, "error": "Empty frame"})
+        elif len(data) > MAX_FRAME_BYTES:
+            errors.append({"index": i, "error": "Frame too large"})
+        elif not warning:
+            errors.append({"index": i, "error": "Missing warning_type"})
+        elif ingest_load.should_shed(user_id, exam_id, warning):
+            shed += 1
+        else:
+            mime = mimetype if mimetype and mimetype.startswith("image/") else sniff_mime(data)
+            if not save_behavior_capture_async(user_id, exam_id, data, mime, warning):
+                errors.append({"index": i, "error": "Queue full"})
+                continue
+            accepted += 1
+
+    if accepted == 0 and errors and all(e["error"] == "Queue full" for e in errors):
+        return jsonify({"error": "Behavior log queue is full, retry later"}), 503, {"Retry-After": "1"}
+
+    return jsonify({
+        "message": f"{accepted} frame(s) queued",
+        "accepted": accepted,
+        "shed": shed,
+        "rejected": errors,
+    }), 202 if accepted or shed else 400
@@ -1,9 +1,29 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+import os
+from services.behavior_service import (
+    inline_image_base64,
+    classify_behavior_logs,
+    lease_unclassified_logs,
+    release_leases,
+)
+from routes.utils.pagination import (
+    page_limit, decode_cursor, keyset_condition, selected_fields, trim_page,
+)
 
 behavior_sync_bp = Blueprint("behavior_sync", __name__)
 
-# 1️⃣  Fetch behavior logs (for classification)
+LEASE_SECONDS = int(os.getenv("CLASSIFIER_LEASE_SECONDS", "120"))
+MAX_LEASE_BATCH = int(os.getenv("CLASSIFIER_MAX_LEASE_BATCH", "200"))
+
+# ?fields= names -> columns; id and timestamp are always returned (they form the cursor)
+FETCH_LOG_FIELDS = {
+    "warning_type": ["warning_type"],
+    "classification_label": ["classification_label"],
+    "image": ["image_hash", "image_base64"],
+}
+
+# 1️⃣  Fetch behavior logs (for classification), paged by ?cursor= / ?limit=
 @behavior_sync_bp.route("/fetch_behavior_logs", methods=["GET"])
 def fetch_behavior_logs():
     user_id = request.args.get("user_id")
@@ -11,18 +31,35 @@ def fetch_behavior_logs():
     if not user_id or not exam_id:
         return jsonify({"error": "Missing user_id or exam_id"}), 400
 
+    try:
+        limit = page_limit()
+        cursor_key = decode_cursor(request.args.get("cursor"))
+        fields = selected_fields(FETCH_LOG_FIELDS, default=["image"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = ["id", "timestamp"]
+    for f in fields:
+        columns += FETCH_LOG_FIELDS[f]
+    after, after_params = keyset_condition("timestamp", "id", cursor_key)
+
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT id, image_base64
+    cur.execute(f"""
+        SELECT {", ".join(columns)}
         FROM suspicious_behavior_logs
-        WHERE user_id=%s AND exam_id=%s AND image_base64 IS NOT NULL
-    """, (user_id, exam_id))
-    logs = cur.fetchall()
+        WHERE user_id=%s AND exam_id=%s
+          AND (image_hash IS NOT NULL OR image_base64 IS NOT NULL){after}
+        ORDER BY timestamp, id
+        LIMIT %s
+    """, (user_id, exam_id, *after_params, limit + 1))
+    logs, next_cursor = trim_page(cur.fetchall(), limit)
+    if "image" in fields:
+        inline_image_base64(logs)
     cur.close()
     conn.close()
 
-    return jsonify({"logs": logs})
+    return jsonify({"logs": logs, "next_cursor": next_cursor})
 
 
 # 2️⃣  Update classification results (called after Hugging Face predicts)
@@ -33,20 +70,73 @@ def update_classifications():
     if not updates:
         return jsonify({"error": "No updates provided"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    lease_id = data.get("lease_id")
+
+    # Validate up front; the last label sent for an id wins
+    labels = {}
+    failed = []
     for row in updates:
+        if not isinstance(row, dict) or "id" not in row or not row.get("label"):
+            failed.append({"id": row.get("id") if isinstance(row, dict) else None,
+                           "error": "Missing id or label"})
+            continue
         try:
-            log_id = row["id"]
-            label = row["label"]
-            cur.execute(
-                "UPDATE suspicious_behavior_logs SET classification_label=%s WHERE id=%s",
-                (label, log_id),
-            )
-        except Exception as e:
-            print(f"⚠️ Update failed for log {log_id}: {e}")
-    conn.commit()
-    cur.close()
-    conn.close()
+            labels[int(row["id"])] = str(row["label"])
+        except (TypeError, ValueError):
+            failed.append({"id": row["id"], "error": "Invalid id"})
+
+    try:
+        updated, unchanged, missing, lost = (
+            classify_behavior_logs(labels, lease_id) if labels else (0, 0, [], [])
+        )
+    except Exception as e:
+        print(f"⚠️ Bulk classification update failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    failed += [{"id": log_id, "error": "Log not found"} for log_id in missing]
+    failed += [{"id": log_id, "error": "Lease expired"} for log_id in lost]
+    return jsonify({
+        "message": f"{updated + unchanged} classifications updated.",
+        "updated": updated,
+        "unchanged": unchanged,
+        "failed": failed,
+    })
+
+
+# 3️⃣  Lease a batch of unclassified logs (any exam) for one classifier worker.
+#     Acknowledge with /update_classifications {"lease_id": ..., "updates": [...]}
+@behavior_sync_bp.route("/classification_jobs/lease", methods=["POST"])
+def lease_classification_jobs():
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = max(1, min(int(data.get("limit", 50)), MAX_LEASE_BATCH))
+        lease_seconds = max(5, int(data.get("lease_seconds", LEASE_SECONDS)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit and lease_seconds must be integers"}), 400
+
+    try:
+        lease_id, logs = lease_unclassified_logs(limit, lease_seconds)
+    except Exception as e:
+        print(f"⚠️ Leasing classification jobs failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "lease_id": lease_id,
+        "lease_seconds": lease_seconds,
+        "logs": inline_image_base64(logs),
+    })
+
+
+# 4️⃣  Give leased logs back without labelling them (worker shutting down, errors)
+@behavior_sync_bp.route("/classification_jobs/release", methods=["POST"])
+def release_classification_jobs():
+    data = request.get_json(silent=True) or {}
+    lease_id = data.get("lease_id")
+    if not lease_id:
+        return jsonify({"error": "Missing lease_id"}), 400
 
-    return jsonify({"message": f"{len(updates)} classifications updated."})
+    try:
+        released = release_leases(lease_id, data.get("ids"))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"message": f"{released} logs released.", "released": released})
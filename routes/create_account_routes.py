@@ -2,9 +2,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token
 from datetime import timedelta
 from database.connection import get_db_connection  
-import bcrypt  
+from services.passwords import hash_password
 from routes.utils.email_utils import send_verification_email
 import uuid
+import os
+from io import BytesIO
+from services import account_service
+from services.roster_import import read_roster, validate_roster
 
 create_account_bp = Blueprint('create_account', __name__)
 
@@ -30,7 +34,7 @@ def create_account():
             return jsonify({"error": "Username or email already exists"}), 409
 
         raw_password = data["password"]
-        hashed_pw = bcrypt.hashpw(raw_password.encode('utf-8'), bcrypt.gensalt())
+        hashed_pw = hash_password(raw_password)
         verify_token = str(uuid.uuid4())
 
         # Insert new user into the users table
@@ -86,6 +90,10 @@ def create_account():
         return jsonify({"error": str(e)}), 500
 
 
+# Imports larger than this run in the background and return a job id
+BULK_ASYNC_THRESHOLD = int(os.getenv("BULK_ASYNC_THRESHOLD", "500"))
+
+
 @create_account_bp.route("/bulk_create_students", methods=["POST"])
 def bulk_create_students():
     data = request.get_json()
@@ -100,73 +108,95 @@ def bulk_create_students():
         return jsonify({"error": "No student data provided"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if len(students) > BULK_ASYNC_THRESHOLD or request.args.get("async") == "1":
+            job_id = account_service.start_bulk_import(students, meta)
+            return jsonify({
+                "message": f"Import of {len(students)} students started.",
+                "job_id": job_id,
+                "status_url": f"/api/bulk_create_students/{job_id}",
+            }), 202
 
-        created_students = []
+        created_students = account_service.bulk_create_students(students, meta)
 
-        for student in students:
-            name = student.get("name")
-            username = student.get("username")
-            email = student.get("email")
-            raw_password = student.get("password")
+        return jsonify({
+            "message": f"{len(created_students)} students added.",
+            "created_students": created_students
+        }), 201
 
-            # Skip if any essential field is missing
-            if not all([name, username, email, raw_password]):
-                continue
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            # Skip if username or email already exists
-            cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (username, email))
-            if cursor.fetchone():
-                continue
 
-            hashed_pw = bcrypt.hashpw(raw_password.encode("utf-8"), bcrypt.gensalt())
-            verify_token = str(uuid.uuid4())
+@create_account_bp.route("/bulk_create_students/<job_id>", methods=["GET"])
+def bulk_create_status(job_id):
+    try:
+        job = account_service.get_import_job(job_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if job is None:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job), 200
 
-            # Insert into users table
-            cursor.execute("""
-                INSERT INTO users (name, username, email, password, user_type, verify_token, is_verified)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                name,
-                username,
-                email,
-                hashed_pw,
-                "Student",
-                verify_token,
-                False
-            ))
 
-            user_id = cursor.lastrowid
+# Roster upload: CSV/XLSX -> validated rows -> bulk creation path above.
+# ?dry_run=1 returns the validation report without creating accounts.
+@create_account_bp.route("/upload_student_roster", methods=["POST"])
+def upload_student_roster():
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "No file uploaded"}), 400
 
-            # Insert into student_profiles table
-            cursor.execute("""
-                INSERT INTO student_profiles (user_id, course, section, year, status)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                user_id,
-                meta["course"],
-                meta["section"],
-                meta["year"],
-                meta["status"]
-            ))
+    meta = {k: request.form.get(k) for k in ["course", "section", "year", "status"]}
+    if not all(meta.values()):
+        return jsonify({"error": "Missing course/section/year/status metadata"}), 400
 
-            # Append student info to return for frontend email sending
-            created_students.append({
-                "name": name,
-                "email": email,
-                "username": username,
-                "password": raw_password,
-                "verify_token": verify_token
-            })
+    try:
+        roster = read_roster(BytesIO(file.read()), file.filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to read roster: {str(e)}"}), 400
 
-        conn.commit()
+    conn = None
+    try:
+        conn = get_db_connection()
+        valid, errors = validate_roster(conn.cursor(), roster)
         conn.close()
-
+        conn = None
+
+        summary = {
+            "total_rows": len(roster),
+            "valid_rows": len(valid),
+            "invalid_rows": len(errors),
+            "errors": errors,
+        }
+
+        if request.args.get("dry_run") == "1" or not valid:
+            return jsonify({
+                "message": f"{len(valid)} of {len(roster)} rows are valid.",
+                "dry_run": request.args.get("dry_run") == "1",
+                **summary,
+            }), 200
+
+        if len(valid) > BULK_ASYNC_THRESHOLD:
+            job_id = account_service.start_bulk_import(valid, meta)
+            return jsonify({
+                "message": f"Import of {len(valid)} students started.",
+                "job_id": job_id,
+                "status_url": f"/api/bulk_create_students/{job_id}",
+                **summary,
+            }), 202
+
+        created_students = account_service.bulk_create_students(valid, meta)
         return jsonify({
             "message": f"{len(created_students)} students added.",
-            "created_students": created_students
+            "created_students": created_students,
+            **summary,
         }), 201
 
     except Exception as e:
+        print("Error in /upload_student_roster:", e)
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.instructor_services import invalidate_instructor_mapping
 
 enrollment_bp = Blueprint('enrollment', __name__)
 
@@ -95,6 +96,7 @@ def assign_student():
             VALUES (%s, %s)
         """, (instructor_id, student_id))
         conn.commit()
+        invalidate_instructor_mapping(student_id)
         return jsonify({"message": "Student assigned successfully."}), 201
 
     except Exception as e:
@@ -120,6 +122,7 @@ def unassign_student():
             WHERE instructor_id = %s AND student_id = %s
         """, (instructor_id, student_id))
         conn.commit()
+        invalidate_instructor_mapping(student_id)
         return jsonify({"message": "Student unassigned successfully."}), 200
     except Exception as e:
         print("Error in /unassign-student:", e)
@@ -128,7 +131,20 @@ def unassign_student():
         if conn:
             conn.close()
 
+# Students in one course/section/year; shared by the group endpoints below
+_GROUP_MATCH = """
+    sp.course = %s AND sp.section = %s AND sp.year = %s
+    AND u.user_type = 'Student'
+"""
+
+
+def _is_dry_run(data):
+    return request.args.get("dry_run") == "1" or data.get("dry_run") is True
+
+
 # Bulk assign students to instructor by course/section/year
+# Set-based (UNIQUE (instructor_id, student_id) makes INSERT IGNORE skip existing rows).
+# ?dry_run=1 only reports the count.
 @enrollment_bp.route("/assign-students-group", methods=["POST"])
 def assign_students_group():
     data = request.get_json()
@@ -143,36 +159,37 @@ def assign_students_group():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Get all matching students
-        cursor.execute("""
-            SELECT u.id FROM users u
-            JOIN student_profiles sp ON u.id = sp.user_id
-            WHERE sp.course = %s AND sp.section = %s AND sp.year = %s
-              AND u.user_type = 'Student'
-        """, (course, section, year))
-        students = cursor.fetchall()
-
-        assigned = 0
-        for s in students:
-            student_id = s["id"]
+        cursor = conn.cursor()
 
-            # Check if already assigned
-            cursor.execute("""
-                SELECT 1 FROM instructor_assignments
-                WHERE instructor_id = %s AND student_id = %s
-            """, (instructor_id, student_id))
+        if _is_dry_run(data):
+            cursor.execute(f"""
+                SELECT COUNT(*), COALESCE(SUM(ia.student_id IS NULL), 0)
+                FROM users u
+                JOIN student_profiles sp ON u.id = sp.user_id
+                LEFT JOIN instructor_assignments ia
+                  ON ia.student_id = u.id AND ia.instructor_id = %s
+                WHERE {_GROUP_MATCH}
+            """, (instructor_id, course, section, year))
+            matched, to_assign = cursor.fetchone()
+            return jsonify({
+                "message": f"{int(to_assign)} students would be assigned.",
+                "matched": matched,
+                "assigned": int(to_assign),
+                "dry_run": True,
+            }), 200
 
-            if not cursor.fetchone():
-                cursor.execute("""
-                    INSERT INTO instructor_assignments (instructor_id, student_id)
-                    VALUES (%s, %s)
-                """, (instructor_id, student_id))
-                assigned += 1
+        cursor.execute(f"""
+            INSERT IGNORE INTO instructor_assignments (instructor_id, student_id)
+            SELECT %s, u.id
+            FROM users u
+            JOIN student_profiles sp ON u.id = sp.user_id
+            WHERE {_GROUP_MATCH}
+        """, (instructor_id, course, section, year))
+        assigned = cursor.rowcount
 
         conn.commit()
-        return jsonify({"message": f"{assigned} students assigned."}), 201
+        invalidate_instructor_mapping()
+        return jsonify({"message": f"{assigned} students assigned.", "assigned": assigned}), 201
 
     except Exception as e:
         print("Error in /assign-students-group:", e)
@@ -180,8 +197,8 @@ def assign_students_group():
     finally:
         if conn:
             conn.close()
-            
-            
+
+
 @enrollment_bp.route("/unassign-students-group", methods=["POST"])
 def unassign_students_group():
     data = request.get_json()
@@ -196,33 +213,41 @@ def unassign_students_group():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
-        # Get all student IDs matching the group
-        cursor.execute("""
-            SELECT u.id FROM users u
+        group_assignments = f"""
+            FROM instructor_assignments ia
+            JOIN users u ON u.id = ia.student_id
             JOIN student_profiles sp ON u.id = sp.user_id
-            WHERE sp.course = %s AND sp.section = %s AND sp.year = %s
-              AND u.user_type = 'Student'
-        """, (course, section, year))
-        students = cursor.fetchall()
+            WHERE ia.instructor_id = %s AND {_GROUP_MATCH}
+        """
+        params = (instructor_id, course, section, year)
 
-        if not students:
-            return jsonify({"message": "No students found for this group."}), 200
+        if _is_dry_run(data):
+            cursor.execute(f"SELECT COUNT(*) {group_assignments}", params)
+            to_unassign = cursor.fetchone()[0]
+            return jsonify({
+                "message": f"{to_unassign} students would be unassigned.",
+                "unassigned": to_unassign,
+                "dry_run": True,
+            }), 200
 
-        unassigned = 0
-        for s in students:
-            student_id = s["id"]
+        cursor.execute(f"DELETE ia {group_assignments}", params)
+        unassigned = cursor.rowcount
 
-            # Delete from assignments if exists
-            cursor.execute("""
-                DELETE FROM instructor_assignments
-                WHERE instructor_id = %s AND student_id = %s
-            """, (instructor_id, student_id))
-            unassigned += cursor.rowcount
+        if unassigned == 0:
+            cursor.execute(f"""
+                SELECT COUNT(*)
+                FROM users u
+                JOIN student_profiles sp ON u.id = sp.user_id
+                WHERE {_GROUP_MATCH}
+            """, (course, section, year))
+            if cursor.fetchone()[0] == 0:
+                return jsonify({"message": "No students found for this group."}), 200
 
         conn.commit()
-        return jsonify({"message": f"{unassigned} students unassigned."}), 200
+        invalidate_instructor_mapping()
+        return jsonify({"message": f"{unassigned} students unassigned.", "unassigned": unassigned}), 200
 
     except Exception as e:
         print("Error in /unassign-students-group:", e)
@@ -230,4 +255,3 @@ def unassign_students_group():
     finally:
         if conn:
             conn.close()
-
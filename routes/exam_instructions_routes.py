@@ -1,6 +1,7 @@
 # routes/exam_instructions_routes.py
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.exam_content import get_exam_instructions as load_exam_instructions, invalidate_exam_instructions
 
 # Schema: exam_instructions(id PK, exam_id UNIQUE/FK, instructions TEXT)
 exam_instructions_bp = Blueprint("exam_instructions", __name__)
@@ -11,21 +12,10 @@ exam_instructions_bp = Blueprint("exam_instructions", __name__)
 @exam_instructions_bp.route("/exam_instructions/<int:exam_id>", methods=["GET"])
 def get_exam_instructions(exam_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
-            "SELECT instructions FROM exam_instructions WHERE exam_id = %s LIMIT 1",
-            (exam_id,),
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
         return jsonify(
             {
                 "exam_id": exam_id,
-                "instructions": (row["instructions"] if row else ""),
+                "instructions": load_exam_instructions(exam_id),
             }
         ), 200
 
@@ -69,6 +59,7 @@ def upsert_exam_instructions(exam_id):
         conn.commit()
         cursor.close()
         conn.close()
+        invalidate_exam_instructions(exam_id)
         return jsonify({"message": "Instructions saved"}), 200
 
     except Exception as e:
@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.exam_content import (
+    get_exam_questions as load_exam_questions,
+    bump_content_version,
+    invalidate_exam_content,
+)
 
 exam_questions_bp = Blueprint("exam_questions", __name__)
 
@@ -8,43 +13,10 @@ exam_questions_bp = Blueprint("exam_questions", __name__)
 # -----------------------------
 @exam_questions_bp.route("/exam_questions/<int:exam_id>", methods=["GET"])
 def get_exam_questions(exam_id):
+    # ?answers=0 hides answer keys (student view)
+    with_answers = request.args.get("answers", "1") != "0"
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT * FROM exam_questions WHERE exam_id = %s", (exam_id,))
-        questions = cursor.fetchall()
-
-        for q in questions:
-            qtype = q.get("question_type", "mcq")
-
-            if qtype == "mcq":
-                cursor.execute(
-                    "SELECT id, option_text, is_correct FROM exam_options WHERE question_id = %s",
-                    (q["id"],),
-                )
-                options = cursor.fetchall()
-
-                for opt in options:
-                    opt["option_text"] = str(opt["option_text"])
-                    opt["is_correct"] = bool(opt["is_correct"])
-
-                q["options"] = options
-                q["correct_answer"] = next(
-                    (i for i, opt in enumerate(options) if opt["is_correct"]), None
-                )
-
-            elif qtype == "identification":
-                q["options"] = []
-                # keep the stored text from DB
-                q["correct_answer"] = q.get("correct_answer")
-
-            else:  # essay or others
-                q["options"] = []
-                q["correct_answer"] = None
-
-        conn.close()
-        return jsonify(questions), 200
+        return jsonify(load_exam_questions(exam_id, with_answers=with_answers)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -90,8 +62,10 @@ def add_exam_question():
                     (question_id, option_text, is_correct),
                 )
 
+        bump_content_version(cursor, exam_id)
         conn.commit()
         conn.close()
+        invalidate_exam_content(exam_id)
         return jsonify({"message": "Question added successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -112,6 +86,10 @@ def update_exam_question(question_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        cursor.execute("SELECT exam_id FROM exam_questions WHERE id = %s", (question_id,))
+        row = cursor.fetchone()
+        exam_id = row[0] if row else None
+
         # Update main question
         cursor.execute(
             "UPDATE exam_questions SET question_text = %s, question_type = %s, correct_answer = %s WHERE id = %s",
@@ -134,8 +112,12 @@ def update_exam_question(question_id):
                     (question_id, option_text, is_correct),
                 )
 
+        if exam_id is not None:
+            bump_content_version(cursor, exam_id)
         conn.commit()
         conn.close()
+        if exam_id is not None:
+            invalidate_exam_content(exam_id)
         return jsonify({"message": "Question updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -150,11 +132,19 @@ def delete_exam_question(question_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        cursor.execute("SELECT exam_id FROM exam_questions WHERE id = %s", (question_id,))
+        row = cursor.fetchone()
+        exam_id = row[0] if row else None
+
         cursor.execute("DELETE FROM exam_options WHERE question_id = %s", (question_id,))
         cursor.execute("DELETE FROM exam_questions WHERE id = %s", (question_id,))
 
+        if exam_id is not None:
+            bump_content_version(cursor, exam_id)
         conn.commit()
         conn.close()
+        if exam_id is not None:
+            invalidate_exam_content(exam_id)
         return jsonify({"message": "Question deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -165,41 +155,8 @@ def delete_exam_question(question_id):
 # -----------------------------
 @exam_questions_bp.route("/exam_with_questions/<int:exam_id>", methods=["GET"])
 def get_exam_with_questions(exam_id):
+    with_answers = request.args.get("answers", "1") != "0"
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT * FROM exam_questions WHERE exam_id = %s", (exam_id,))
-        questions = cursor.fetchall()
-
-        for q in questions:
-            qtype = q.get("question_type", "mcq")
-
-            if qtype == "mcq":
-                cursor.execute(
-                    "SELECT id, option_text, is_correct FROM exam_options WHERE question_id = %s",
-                    (q["id"],),
-                )
-                options = cursor.fetchall()
-
-                for opt in options:
-                    opt["option_text"] = str(opt["option_text"])
-                    opt["is_correct"] = bool(opt["is_correct"])
-
-                q["options"] = options
-                q["correct_answer"] = next(
-                    (i for i, opt in enumerate(options) if opt["is_correct"]), None
-                )
-
-            elif qtype == "identification":
-                q["options"] = []
-                q["correct_answer"] = q.get("correct_answer")
-
-            else:  # essay
-                q["options"] = []
-                q["correct_answer"] = None
-
-        conn.close()
-        return jsonify(questions), 200
+        return jsonify(load_exam_questions(exam_id, with_answers=with_answers)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.exam_content import invalidate_exam_roster
 from datetime import datetime, timedelta
 import email.utils
 
@@ -58,6 +59,7 @@ def add_student_to_exam():
             VALUES (%s, %s)
         """, (exam_id, student_id))
         conn.commit()
+        invalidate_exam_roster(exam_id)
         return jsonify({"message": "Student added."}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -76,6 +78,7 @@ def remove_student_from_exam(exam_id, student_id):
             WHERE exam_id = %s AND student_id = %s
         """, (exam_id, student_id))
         conn.commit()
+        invalidate_exam_roster(exam_id)
         return jsonify({"message": "Student removed."}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,188 +1,81 @@
 
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.submission_service import (
+    SUBMIT_ASYNC_DEFAULT,
+    default_idempotency_key,
+    enqueue_submission,
+    get_submission_job,
+    process_submission,
+    validate_submission,
+)
 from datetime import datetime
+import json
 import traceback
 
 exam_submit_bp = Blueprint("exam_submit_bp", __name__)
 
 ## -----------------------------
 #  Submit Exam with answers and auto-score
+#  ?async=1 (or "async": true) records the payload and returns 202; poll
+#  /submission_status/<job_id>. Retries with the same Idempotency-Key
+#  header / "idempotency_key" (default: hash of the payload) collapse.
 # -----------------------------
 @exam_submit_bp.route("/submit_exam", methods=["POST"])
 def submit_exam():
     data = request.get_json(force=True) or {}
-    user_id = data.get("user_id")
-    exam_id = data.get("exam_id")
-    answers = data.get("answers") or {}
-    language = data.get("language")        # for coding exam
-    code = data.get("code")                # student's source code
-    output = data.get("output") or ""      # last console output
+    error = validate_submission(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    if not user_id or not exam_id:
-        return jsonify({"error": "Missing user_id or exam_id"}), 400
-    if not isinstance(answers, dict) and not code:
-        return jsonify({"error": "Invalid request body"}), 400
+    async_flag = data.pop("async", False) is True
+    run_async = request.args.get("async") == "1" or async_flag
+    idempotency_key = request.headers.get("Idempotency-Key") or data.pop("idempotency_key", None)
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Fetch exam details
-        cursor.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
-        exam = cursor.fetchone()
-
-        if not exam:
-            return jsonify({"error": "Exam not found"}), 404
-
-        exam_category = exam.get("exam_category")  # QA or CODING
-        now = datetime.now()
-
-        # -------------------------------------------------------------------
-        # 🧩 Handle CODING Exams
-        # -------------------------------------------------------------------
-        if exam_category and exam_category.upper() == "CODING":
-            if not code or not language:
-                return jsonify({"error": "Missing code or language"}), 400
-
-            # Insert a submission entry in exam_submissions table
-            cursor.execute("""
-                INSERT INTO exam_submissions (user_id, exam_id, score, total_score, submitted_at)
-                VALUES (%s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    submitted_at = VALUES(submitted_at),
-                    id = LAST_INSERT_ID(id)
-            """, (user_id, exam_id, 0, 0, now))
-
-            # Save code submission details (✅ uses student_id)
-            cursor.execute("""
-                INSERT INTO coding_submissions (student_id, exam_id, language, code, output, submitted_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    code = VALUES(code),
-                    output = VALUES(output),
-                    submitted_at = VALUES(submitted_at)
-            """, (user_id, exam_id, language, code, output, now))
-
-            conn.commit()
-            conn.close()
-
+        if SUBMIT_ASYNC_DEFAULT or run_async:
+            key = str(idempotency_key or default_idempotency_key(data))[:128]
+            job, created = enqueue_submission(data, key)
             return jsonify({
-                "message": "✅ Coding exam submitted successfully",
-                "exam_id": exam_id,
-                "language": language,
-                "category": "CODING"
-            }), 200
-
-        # -------------------------------------------------------------------
-        # 🧩 Handle QA Exams (unchanged)
-        # -------------------------------------------------------------------
-        cursor.execute("SELECT * FROM exam_questions WHERE exam_id = %s", (exam_id,))
-        questions = cursor.fetchall()
-
-        total_score = len(questions)
-        if total_score == 0:
-            conn.close()
-            return jsonify({"error": "No questions found"}), 400
+                "message": "Submission received" if created else "Submission already received",
+                "job_id": job["id"],
+                "status": job["status"],
+                "status_url": f"/api/submission_status/{job['id']}",
+            }), 202
 
-        cursor.execute("""
-            INSERT INTO exam_submissions (user_id, exam_id, score, total_score, submitted_at)
-            VALUES (%s, %s, 0, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                submitted_at = VALUES(submitted_at),
-                id = LAST_INSERT_ID(id)
-        """, (user_id, exam_id, total_score, now))
-        submission_id = cursor.lastrowid
-
-        score = 0
-        review = []
-
-        for q in questions:
-            q_id = q["id"]
-            q_type = q.get("question_type", "mcq")
-            student_answer = answers.get(str(q_id))
-
-            selected_option_id = None
-            selected_text = None
-            essay_answer = None
-            is_correct = None
-            correct_answer = None
-
-            # ----- MCQ -----
-            if q_type == "mcq":
-                cursor.execute(
-                    "SELECT id, option_text, is_correct FROM exam_options WHERE question_id = %s",
-                    (q_id,),
-                )
-                options = cursor.fetchall()
-
-                correct_opt = next((o for o in options if o["is_correct"]), None)
-                correct_answer = correct_opt["option_text"] if correct_opt else None
-
-                selected_opt = next((o for o in options if o["id"] == student_answer), None)
-                selected_option_id = student_answer
-                selected_text = selected_opt["option_text"] if selected_opt else None
-
-                is_correct = 1 if (selected_opt and selected_opt["is_correct"]) else 0
-                if is_correct:
-                    score += 1
-
-            # ----- Identification -----
-            elif q_type == "identification":
-                correct_answer = q.get("correct_answer")
-                selected_text = (student_answer or "").strip()
-                is_correct = 1 if correct_answer and selected_text.lower() == correct_answer.lower() else 0
-                if is_correct:
-                    score += 1
-
-            # ----- Essay -----
-            elif q_type == "essay":
-                essay_answer = (student_answer or "").strip()
-                is_correct = None  # manual grading
-
-            # Save to exam_answers
-            cursor.execute("""
-                INSERT INTO exam_answers
-                  (submission_id, question_id, selected_option_id, selected_text, essay_answer, is_correct)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                  selected_option_id = VALUES(selected_option_id),
-                  selected_text = VALUES(selected_text),
-                  essay_answer = VALUES(essay_answer),
-                  is_correct = VALUES(is_correct)
-            """, (submission_id, q_id, selected_option_id, selected_text, essay_answer, is_correct))
-
-            review.append({
-                "question_id": q_id,
-                "question_text": q["question_text"],
-                "question_type": q_type,
-                "selected_answer": essay_answer if q_type == "essay" else selected_text,
-                "correct_answer": correct_answer,
-                "is_correct": (None if is_correct is None else bool(is_correct)),
-            })
+        body, status = process_submission(data)
+        return jsonify(body), status
 
-        # Finalize submission score
-        cursor.execute(
-            "UPDATE exam_submissions SET score = %s, total_score = %s WHERE id = %s",
-            (score, total_score, submission_id),
-        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        conn.commit()
-        conn.close()
 
-        return jsonify({
-            "message": "Exam submitted successfully",
-            "score": score,
-            "total_score": total_score,
-            "answers": review
-        }), 200
+# -----------------------------
+#  Status of an asynchronous submission
+# -----------------------------
+@exam_submit_bp.route("/submission_status/<int:job_id>", methods=["GET"])
+def submission_status(job_id):
+    try:
+        job = get_submission_job(job_id)
+        if not job:
+            return jsonify({"error": "Submission not found"}), 404
+
+        body = {
+            "job_id": job["id"],
+            "user_id": job["user_id"],
+            "exam_id": job["exam_id"],
+            "status": job["status"],      # queued | grading | done | failed
+            "attempts": job["attempts"],
+        }
+        if job["status"] in ("done", "failed") and job["result"]:
+            body["result_status"] = job["result_status"]
+            body["result"] = json.loads(job["result"])
+        return jsonify(body), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-
-
 # -----------------------------
 #  exam submision to make a condition for take exam 
 # -----------------------------
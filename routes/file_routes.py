@@ -1,8 +1,8 @@
 # routes/file_routes.py
 from flask import Blueprint, send_from_directory, abort, jsonify, request
 from flask_cors import CORS
-import fitz  # PyMuPDF
 import os
+from services.pdf_text import extract_pdf_text
 
 # ---------------------------------------------------------------------
 # Setup
@@ -52,15 +52,8 @@ def get_exam_text(filename):
         if not os.path.isfile(pdf_path):
             return jsonify({"error": "PDF file not found."}), 404
 
-        # Extract text safely
-        text = []
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                page_text = page.get_text("text").strip()
-                if page_text:
-                    text.append(page_text)
-
-        content = "\n\n".join(text)
+        # Extract text safely (cached until the file changes)
+        content = extract_pdf_text(pdf_path)
         if not content.strip():
             return jsonify({"error": "No readable text found in this PDF."}), 422
 
@@ -1,5 +1,12 @@
-from flask import Blueprint, jsonify, request
+import io
+from flask import Blueprint, jsonify, request, send_file
 from database.connection import get_db_connection
+from services.behavior_service import attach_image_urls, sniff_mime, decode_image_base64
+from services.image_service import normalize_capture
+from routes.utils.pagination import (
+    page_limit, decode_cursor, keyset_condition, selected_fields, trim_page,
+)
+from services.blob_store import get_blob_store, is_valid_hash
 
 get_behavior_images_bp = Blueprint('get_behavior_images_bp', __name__)
 
@@ -68,27 +75,112 @@ def get_exam_behavior(exam_id):
         cursor.close()
         conn.close()
 
-# Get all behavior images for a student in a specific exam
+# ?fields= names -> columns; id and timestamp are always returned (they form the cursor)
+BEHAVIOR_IMAGE_FIELDS = {
+    "warning_type": ["warning_type"],
+    "classification_label": ["classification_label"],
+    "image": ["image_hash", "thumb_hash", "(image_base64 IS NOT NULL) AS has_inline_image"],
+}
+
+# Get all behavior images for a student in a specific exam (newest first, paged)
 @get_behavior_images_bp.route('/behavior-images/<int:exam_id>/<int:student_id>', methods=['GET'])
 def get_behavior_images(exam_id, student_id):
+    try:
+        limit = page_limit()
+        cursor_key = decode_cursor(request.args.get("cursor"))
+        fields = selected_fields(BEHAVIOR_IMAGE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = ["id", "timestamp"]
+    for f in fields:
+        columns += BEHAVIOR_IMAGE_FIELDS[f]
+    after, after_params = keyset_condition("timestamp", "id", cursor_key, descending=True)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT {", ".join(columns)}
+            FROM suspicious_behavior_logs
+            WHERE exam_id = %s AND user_id = %s{after}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s
+        """, (exam_id, student_id, *after_params, limit + 1))
+        images, next_cursor = trim_page(cursor.fetchall(), limit)
+        if "image" in fields:
+            attach_image_urls(images)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return jsonify(images), 200, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# Stream a stored behavior capture by content hash
+@get_behavior_images_bp.route('/behavior-image/<blob_hash>', methods=['GET'])
+def get_behavior_image(blob_hash):
+    if not is_valid_hash(blob_hash):
+        return jsonify({"error": "Invalid image id"}), 400
+
+    store = get_blob_store()
+    if not store.exists(blob_hash):
+        return jsonify({"error": "Image not found"}), 404
+
+    stream = store.open(blob_hash)
+    mime = sniff_mime(stream.read(16))
+    stream.seek(0)
+
+    # Content-addressed, so the bytes behind a hash never change
+    response = send_file(stream, mimetype=mime, etag=blob_hash, conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# Full frame (or ?size=thumb) for a single behavior log, including legacy inline rows
+@get_behavior_images_bp.route('/behavior-log-image/<int:log_id>', methods=['GET'])
+def get_behavior_log_image(log_id):
+    want_thumb = request.args.get("size") == "thumb"
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
-            SELECT image_base64, warning_type, timestamp, classification_label
+            SELECT image_hash, thumb_hash, image_base64
             FROM suspicious_behavior_logs
-            WHERE exam_id = %s AND user_id = %s
-            ORDER BY timestamp DESC
-        """, (exam_id, student_id))
-        images = cursor.fetchall()
-        return jsonify(images), 200
+            WHERE id = %s
+        """, (log_id,))
+        row = cursor.fetchone()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
             conn.close()
-            
-            
+
+    if not row:
+        return jsonify({"error": "Behavior log not found"}), 404
+
+    blob_hash = (row["thumb_hash"] if want_thumb else None) or row["image_hash"]
+    if blob_hash:
+        return get_behavior_image(blob_hash)
+
+    if not row["image_base64"]:
+        return jsonify({"error": "Image not found"}), 404
+    try:
+        data, mime = decode_image_base64(row["image_base64"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+    if want_thumb:
+        _, _, thumb = normalize_capture(data)
+        if thumb:
+            data, mime = thumb, "image/jpeg"
+    return send_file(io.BytesIO(data), mimetype=mime, max_age=3600)
+
+
 # fetch behavior logs for that specific student and exam
 @get_behavior_images_bp.route('/student-exams/<int:student_id>', methods=['GET'])
 def get_student_exams(student_id):
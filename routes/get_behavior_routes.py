@@ -1,10 +1,25 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.behavior_service import attach_image_urls
+from services.behavior_counters import summarize
+from routes.utils.pagination import (
+    page_limit, decode_cursor, keyset_condition, selected_fields, trim_page,
+)
 
 # New blueprint name to avoid conflict
 get_behavior_bp = Blueprint('get_behavior', __name__)
 
+# ?fields= names -> columns; id and timestamp are always returned (they form the cursor)
+BEHAVIOR_LOG_FIELDS = {
+    "exam_id": ["sbl.exam_id"],
+    "warning_type": ["sbl.warning_type"],
+    "classification_label": ["sbl.classification_label"],
+    "title": ["e.title"],
+    "image": ["sbl.image_hash", "sbl.thumb_hash", "(sbl.image_base64 IS NOT NULL) AS has_inline_image"],
+}
+
 #  GET /api/get_behavior_logs - fetch suspicious behavior logs for a user
+#  Paged by ?cursor= / ?limit=; the next cursor comes back in the X-Next-Cursor header
 @get_behavior_bp.route('/get_behavior_logs', methods=['GET'])
 def get_behavior_logs():
     user_id = request.args.get('user_id')
@@ -12,28 +27,39 @@ def get_behavior_logs():
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
+    try:
+        limit = page_limit()
+        cursor_key = decode_cursor(request.args.get('cursor'))
+        fields = selected_fields(BEHAVIOR_LOG_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = ["sbl.id", "sbl.timestamp"]
+    for f in fields:
+        columns += BEHAVIOR_LOG_FIELDS[f]
+    join = "JOIN exams e ON sbl.exam_id = e.id" if "title" in fields else ""
+    after, after_params = keyset_condition("sbl.timestamp", "sbl.id", cursor_key)
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("""
-            SELECT 
-                sbl.exam_id,
-                sbl.timestamp,
-                sbl.warning_type,
-                sbl.image_base64,
-                 sbl.classification_label,
-                e.title
+        cursor.execute(f"""
+            SELECT {", ".join(columns)}
             FROM suspicious_behavior_logs sbl
-            JOIN exams e ON sbl.exam_id = e.id
-            WHERE sbl.user_id = %s
-            ORDER BY sbl.timestamp ASC
-        """, (user_id,))
+            {join}
+            WHERE sbl.user_id = %s{after}
+            ORDER BY sbl.timestamp ASC, sbl.id ASC
+            LIMIT %s
+        """, (user_id, *after_params, limit + 1))
         
-        logs = cursor.fetchall()
+        logs, next_cursor = trim_page(cursor.fetchall(), limit)
+        if "image" in fields:
+            attach_image_urls(logs)
         conn.close()
 
-        return jsonify(logs), 200
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return jsonify(logs), 200, headers
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -50,56 +76,35 @@ def get_exam_behavior_summary():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        # ✅ Fetch all behavior logs for this exam
-        cursor.execute("""
-            SELECT 
-                sbl.user_id,
-                sbl.exam_id,
-                sbl.warning_type,
-                sbl.classification_label,
-                sbl.timestamp,
-                e.title
-            FROM suspicious_behavior_logs sbl
-            JOIN exams e ON sbl.exam_id = e.id
-            WHERE sbl.exam_id = %s
-        """, (exam_id,))
-        logs = cursor.fetchall()
-
-        # ============================================
-        # 📊 Aggregate Summary
-        # ============================================
-        total_students = len(set(log["user_id"] for log in logs))
-        suspicious = len([log for log in logs if log["classification_label"] == "Suspicious"])
-        clean = len([log for log in logs if log["classification_label"] == "Clean"])
-
-        # 🧩 Count behavior types (No Face, Hand Detected, etc.)
-        behavior_counts = {}
-        for log in logs:
-            w = log.get("warning_type", "Unknown")
-            behavior_counts[w] = behavior_counts.get(w, 0) + 1
-
-        # 🧠 Top suspicious students by count
-        suspicious_by_student = {}
-        for log in logs:
-            uid = log["user_id"]
-            if log["classification_label"] == "Suspicious":
-                suspicious_by_student[uid] = suspicious_by_student.get(uid, 0) + 1
-
-        top_students = sorted(
-            [{"user_id": k, "count": v} for k, v in suspicious_by_student.items()],
-            key=lambda x: x["count"],
-            reverse=True
-        )
+        cursor.execute("SELECT title FROM exams WHERE id = %s", (exam_id,))
+        exam = cursor.fetchone()
+
+        # ✅ Grouped counts: maintained counter table by default,
+        #    ?source=logs aggregates suspicious_behavior_logs directly
+        if request.args.get('source') == 'logs':
+            cursor.execute("""
+                SELECT
+                    user_id,
+                    COALESCE(warning_type, 'Unknown') AS warning_type,
+                    classification_label,
+                    COUNT(*) AS log_count
+                FROM suspicious_behavior_logs
+                WHERE exam_id = %s
+                GROUP BY user_id, COALESCE(warning_type, 'Unknown'), classification_label
+            """, (exam_id,))
+        else:
+            cursor.execute("""
+                SELECT user_id, warning_type, classification_label, log_count
+                FROM behavior_log_counters
+                WHERE exam_id = %s AND log_count > 0
+            """, (exam_id,))
+        grouped = cursor.fetchall()
 
         # ✅ Combine into response
         summary = {
             "exam_id": exam_id,
-            "title": logs[0]["title"] if logs else "Unknown Exam",
-            "total_students": total_students,
-            "suspicious_count": suspicious,
-            "clean_count": clean,
-            "behavior_counts": behavior_counts,
-            "top_students": top_students,
+            "title": exam["title"] if exam and grouped else "Unknown Exam",
+            **summarize(grouped),
         }
 
         conn.close()
@@ -1,9 +1,19 @@
 from flask import Blueprint, jsonify, request
 from database.connection import get_db_connection
+from services.live_state import live_state
+from services.instructor_services import get_instructor_id_for_student
+from services.cache import SingleFlight, TTLCache, cached_single_flight
 from datetime import datetime, date, time, timedelta  
+import os
 
 get_exam_bp = Blueprint('get_exam', __name__)
 
+# Every student calls /get_exam at the scheduled start; share the fetch and
+# keep the answer briefly.
+STUDENT_EXAMS_TTL = float(os.getenv("STUDENT_EXAMS_TTL", "5"))  # seconds
+_student_exams_cache = TTLCache(ttl=STUDENT_EXAMS_TTL)
+_student_exams_flight = SingleFlight("get_exam")
+
 @get_exam_bp.route('/get_exam', methods=['GET'])
 def get_exam():
     student_id = request.args.get('student_id')
@@ -13,7 +23,20 @@ def get_exam():
         return jsonify({"error": "Missing student_id"}), 400
 
     try:
-        conn = get_db_connection()
+        exams = cached_single_flight(
+            _student_exams_cache, _student_exams_flight, int(student_id),
+            lambda: _load_student_exams(student_id),
+        )
+        return jsonify(exams), 200
+
+    except Exception as e:
+        print("Error fetching exams:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+def _load_student_exams(student_id):
+    conn = get_db_connection()
+    try:
         cursor = conn.cursor(dictionary=True)
         query = """
                     SELECT e.id, e.title, e.description, e.duration_minutes, e.exam_date,
@@ -26,51 +49,43 @@ def get_exam():
 
         cursor.execute(query, (student_id,))
         exams = cursor.fetchall()
+    finally:
+        conn.close()
 
-        for exam in exams:
-            # Format exam_date
-            if isinstance(exam["exam_date"], (datetime, date)):
-                exam["exam_date"] = exam["exam_date"].strftime("%Y-%m-%d")
+    for exam in exams:
+        # Format exam_date
+        if isinstance(exam["exam_date"], (datetime, date)):
+            exam["exam_date"] = exam["exam_date"].strftime("%Y-%m-%d")
 
-            # Handle start_time safely
-            if isinstance(exam["start_time"], timedelta):
-                total_seconds = int(exam["start_time"].total_seconds())
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes, _ = divmod(remainder, 60)
-                exam["start_time"] = f"{hours:02}:{minutes:02}:00"
-            elif isinstance(exam["start_time"], time):
-                exam["start_time"] = exam["start_time"].strftime("%H:%M:%S")
+        # Handle start_time safely
+        if isinstance(exam["start_time"], timedelta):
+            total_seconds = int(exam["start_time"].total_seconds())
+            hours, remainder = divmod(total_seconds, 3600)
+            minutes, _ = divmod(remainder, 60)
+            exam["start_time"] = f"{hours:02}:{minutes:02}:00"
+        elif isinstance(exam["start_time"], time):
+            exam["start_time"] = exam["start_time"].strftime("%H:%M:%S")
 
-            # Handle duration_minutes safely
-            if isinstance(exam["duration_minutes"], timedelta):
-                exam["duration_minutes"] = int(exam["duration_minutes"].total_seconds() // 60)
+        # Handle duration_minutes safely
+        if isinstance(exam["duration_minutes"], timedelta):
+            exam["duration_minutes"] = int(exam["duration_minutes"].total_seconds() // 60)
 
-        conn.close()
-        return jsonify(exams), 200
+    return exams
 
-    except Exception as e:
-        print("Error fetching exams:", e)
-        return jsonify({"error": str(e)}), 500
 
+# Live flags below go to the in-memory live state store and are flushed
+# to instructor_assignments in the background (services/live_state.py).
 
 @get_exam_bp.route('/update_exam_status_start', methods=['POST'])
 def update_exam_status_start():
     data = request.get_json()
     student_id = data.get("student_id")
 
+    if not student_id:
+        return jsonify({"error": "Missing student_id"}), 400
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE instructor_assignments 
-            SET is_taking_exam = 1
-            WHERE student_id = %s
-            """,
-            (student_id,)  #  FIXED tuple syntax
-        )
-        conn.commit()
-        conn.close()
+        live_state.set_flags(student_id, is_taking_exam=1)
         return jsonify({"message": "Exam started, status updated"}), 200
 
     except Exception as e:
@@ -83,21 +98,11 @@ def update_exam_status_submit():
     data = request.get_json()
     student_id = data.get("student_id")
 
+    if not student_id:
+        return jsonify({"error": "Missing student_id"}), 400
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE instructor_assignments
-            SET is_taking_exam = 0,
-                suspicious_behavior_count = 0,
-                is_other_tab = 0
-            WHERE student_id = %s
-            """,
-            (student_id,)  #  FIXED tuple syntax
-        )
-        conn.commit()
-        conn.close()
+        live_state.reset_exam(student_id, is_taking_exam=0, is_other_tab=0)
         return jsonify({"message": "Exam started, status updated"}), 200
 
     except Exception as e:
@@ -115,16 +120,7 @@ def increment_suspicious():
         return jsonify({"error": "Missing student_id or exam_id"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            UPDATE instructor_assignments
-            SET suspicious_behavior_count = suspicious_behavior_count + 1
-            WHERE student_id = %s AND instructor_id = %s
-        """, (student_id, instructor_id))
-
-        conn.commit()
+        live_state.increment_suspicious(student_id, instructor_id=int(instructor_id))
         return jsonify({"message": "Suspicious behavior count updated."}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -141,16 +137,7 @@ def update_tab_status():
         if not student_id or not instructor_id:
             return jsonify({"error": "Missing student_id or instructor_id"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            UPDATE instructor_assignments
-            SET is_other_tab = %s
-            WHERE student_id = %s AND instructor_id = %s
-        """, (is_other_tab, student_id, instructor_id))
-        conn.commit()
-
+        live_state.set_flags(student_id, instructor_id=int(instructor_id), is_other_tab=is_other_tab)
         return jsonify({"message": "Tab status updated successfully"}), 200
 
     except Exception as e:
@@ -163,24 +150,11 @@ def update_status_timeup():
     data = request.get_json()
     student_id = data.get("student_id")
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE instructor_assignments 
-            SET is_taking_exam = 0,
-                suspicious_behavior_count = 0
-                is_other_tab = 0
-            WHERE student_id = %s
-            """,
-            (student_id,)
-        )
-
-        conn.commit()
-        conn.close()
+    if not student_id:
+        return jsonify({"error": "Missing student_id"}), 400
 
+    try:
+        live_state.reset_exam(student_id, is_taking_exam=0, is_other_tab=0)
         return jsonify({"message": "Status reset due to time up"}), 200
 
     except Exception as e:
@@ -193,21 +167,14 @@ def logout_exam():
     data = request.get_json()
     student_id = data.get("student_id")
 
+    if not student_id:
+        return jsonify({"error": "Missing student_id"}), 400
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE instructor_assignments
-            SET is_login = 0, is_taking_exam = 0
-            WHERE student_id = %s
-        """, (student_id,))
-        conn.commit()
+        live_state.set_flags(student_id, is_login=0, is_taking_exam=0)
         return jsonify({"message": "Status reset on logout"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
     
     
 @get_exam_bp.route("/get-instructor-id", methods=["GET"])
@@ -217,15 +184,9 @@ def get_instructor_id():
         return jsonify({"error": "Missing student_id"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT instructor_id FROM instructor_assignments WHERE student_id = %s LIMIT 1",
-            (student_id,)
-        )
-        result = cursor.fetchone()
-        if result:
-            return jsonify({"instructor_id": result[0]}), 200
+        instructor_id = get_instructor_id_for_student(int(student_id))
+        if instructor_id is not None:
+            return jsonify({"instructor_id": instructor_id}), 200
         else:
             return jsonify({"error": "Instructor not found"}), 404
     except Exception as e:
@@ -0,0 +1,146 @@
+# routes/heartbeat_routes.py
+# One batched request per exam client instead of separate tab / suspicious /
+# capture / status calls.
+import os
+from flask import Blueprint, request, jsonify
+from services.live_state import live_state
+from services.behavior_service import decode_image_base64, save_behavior_logs_bulk
+from services.ingest_load import ingest_load
+from routes.utils.backpressure import with_backpressure
+
+heartbeat_bp = Blueprint('heartbeat', __name__)
+
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "5"))          # seconds
+HEARTBEAT_MAX_INTERVAL = float(os.getenv("HEARTBEAT_MAX_INTERVAL", "30"))  # seconds
+MAX_EVENTS_PER_HEARTBEAT = int(os.getenv("MAX_EVENTS_PER_HEARTBEAT", "100"))
+MAX_CAPTURES_PER_HEARTBEAT = int(os.getenv("MAX_CAPTURES_PER_HEARTBEAT", "20"))
+
+STATUS_EVENTS = ("start", "submit", "timeup", "logout")
+
+
+def next_heartbeat_interval():
+    """Stretch the recommended interval as the ingest path gets loaded."""
+    load = min(ingest_load.load(), 1.0)
+    return round(min(HEARTBEAT_INTERVAL * (1 + 3 * load), HEARTBEAT_MAX_INTERVAL), 1)
+
+
+def _parse_event(event, exam_id):
+    """Validate one event; returns a normalized tuple or raises ValueError."""
+    if not isinstance(event, dict):
+        raise ValueError("Event must be an object")
+    kind = event.get("type")
+
+    if kind == "tab":
+        return ("tab", 1 if event.get("is_other_tab") else 0)
+
+    if kind == "suspicious":
+        n = event.get("count", 1)
+        if not isinstance(n, int) or n < 1:
+            raise ValueError("count must be a positive integer")
+        return ("suspicious", n)
+
+    if kind == "status":
+        status = event.get("status")
+        if status not in STATUS_EVENTS:
+            raise ValueError(f"status must be one of {', '.join(STATUS_EVENTS)}")
+        return ("status", status)
+
+    if kind == "capture":
+        warning_type = event.get("warning_type")
+        image_base64 = event.get("image_base64")
+        capture_exam = event.get("exam_id", exam_id)
+        if not warning_type or not image_base64 or not capture_exam:
+            raise ValueError("capture needs warning_type, image_base64 and exam_id")
+        data, mime = decode_image_base64(image_base64)
+        return ("capture", (int(capture_exam), data, mime, warning_type))
+
+    raise ValueError(f"Unknown event type: {kind!r}")
+
+
+def _apply_status(student_id, status):
+    if status == "start":
+        live_state.set_flags(student_id, is_taking_exam=1)
+    elif status in ("submit", "timeup"):
+        live_state.reset_exam(student_id, is_taking_exam=0, is_other_tab=0)
+    elif status == "logout":
+        live_state.set_flags(student_id, is_login=0, is_taking_exam=0)
+
+
+# POST /api/heartbeat
+# {
+#   "student_id": 12, "exam_id": 3, "instructor_id": 4,   (instructor_id optional)
+#   "events": [
+#     {"type": "tab", "is_other_tab": 1},
+#     {"type": "suspicious", "count": 2},
+#     {"type": "capture", "warning_type": "Looking Away", "image_base64": "..."},
+#     {"type": "status", "status": "start" | "submit" | "timeup" | "logout"}
+#   ]
+# }
+# Events are validated as a batch, then applied in order: live flags go to the
+# live state store, captures are inserted together in one transaction.
+# tab/suspicious events hit the given instructor's assignment row; without
+# instructor_id, tab applies to every row and suspicious to the latest one.
+@heartbeat_bp.route('/heartbeat', methods=['POST'])
+@with_backpressure
+def heartbeat():
+    data = request.get_json(silent=True) or {}
+    student_id = data.get("student_id")
+    exam_id = data.get("exam_id")
+    instructor_id = data.get("instructor_id")
+    events = data.get("events") or []
+
+    if not student_id:
+        return jsonify({"error": "Missing student_id"}), 400
+    if not isinstance(events, list):
+        return jsonify({"error": "events must be a list"}), 400
+    if len(events) > MAX_EVENTS_PER_HEARTBEAT:
+        return jsonify({"error": f"At most {MAX_EVENTS_PER_HEARTBEAT} events per heartbeat"}), 413
+
+    try:
+        student_id = int(student_id)
+        exam_id = int(exam_id) if exam_id else None
+        instructor_id = int(instructor_id) if instructor_id else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "student_id, exam_id and instructor_id must be integers"}), 400
+
+    parsed = []
+    for i, event in enumerate(events):
+        try:
+            parsed.append(_parse_event(event, exam_id))
+        except ValueError as e:
+            return jsonify({"error": str(e), "index": i}), 400
+
+    captures = [(student_id, *payload) for kind, payload in parsed if kind == "capture"]
+    if len(captures) > MAX_CAPTURES_PER_HEARTBEAT:
+        return jsonify({"error": f"At most {MAX_CAPTURES_PER_HEARTBEAT} captures per heartbeat"}), 413
+
+    try:
+        kept = [c for c in captures if not ingest_load.should_shed(c[0], c[1], c[4])]
+        # captures first: if the insert fails nothing else is applied either
+        saved = save_behavior_logs_bulk(kept) if kept else 0
+
+        suspicious = 0
+        for kind, payload in parsed:
+            if kind == "tab":
+                live_state.set_flags(student_id, instructor_id=instructor_id, is_other_tab=payload)
+            elif kind == "suspicious":
+                suspicious += payload
+            elif kind == "status":
+                if suspicious:
+                    live_state.increment_suspicious(student_id, suspicious, instructor_id=instructor_id)
+                    suspicious = 0
+                _apply_status(student_id, payload)
+        if suspicious:
+            live_state.increment_suspicious(student_id, suspicious, instructor_id=instructor_id)
+
+        return jsonify({
+            "applied": len(parsed),
+            "captures_saved": saved,
+            "captures_shed": len(captures) - len(kept),
+            "next_interval": next_heartbeat_interval(),
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Error in /heartbeat:", e)
+        return jsonify({"error": str(e)}), 500
@@ -1,5 +1,12 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.exam_content import (
+    invalidate_exam_content,
+    invalidate_exam_instructions,
+    invalidate_exam_roster,
+)
+from services.regrade import regrade_exam
+from services.behavior_counters import delete_counters
 from datetime import datetime
 import traceback
 
@@ -85,10 +92,16 @@ def delete_exam(exam_id):
         # 🆕 Delete coding submissions linked to this exam
         cursor.execute("DELETE FROM coding_submissions WHERE exam_id=%s", (exam_id,))
 
+        # Behavior summary counters (the logs themselves cascade with the exam)
+        delete_counters(cursor, exam_id=exam_id)
+
         # ✅ Finally, delete the exam itself
         cursor.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
 
         conn.commit()
+        invalidate_exam_content(exam_id)
+        invalidate_exam_instructions(exam_id)
+        invalidate_exam_roster(exam_id)
         return jsonify({"message": "Exam and related data deleted successfully"}), 200
 
     except Exception as e:
@@ -100,6 +113,18 @@ def delete_exam(exam_id):
             conn.close()
 
 
+# POST /api/exams/<int:exam_id>/regrade[?dry_run=1]
+# Recompute answer correctness and scores after the answer key changed
+@instructor_exam_bp.route("/exams/<int:exam_id>/regrade", methods=["POST"])
+def regrade_exam_route(exam_id):
+    try:
+        summary = regrade_exam(exam_id, dry_run=request.args.get("dry_run") == "1")
+        return jsonify(summary), 200
+    except Exception as e:
+        print("[ERROR] Exam regrade failed:", e)
+        return jsonify({"error": str(e)}), 500
+
+
 # PUT /api/exams/<int:exam_id>
 @instructor_exam_bp.route("/exams/<int:exam_id>", methods=["PUT"])
 def update_exam(exam_id):
@@ -1,46 +1,135 @@
-from flask import Blueprint, request, jsonify
-from database.connection import get_db_connection
+import json
+import os
+import queue
+import random
+import threading
+import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from services.live_state import live_state
+from services.exam_content import get_exam_roster
 
 instructor_behavior_bp = Blueprint('instructor_behavior_bp', __name__)
 
+# Seconds between full re-diffs of the roster (catches changes made in other workers)
+STREAM_RESYNC_SECONDS = float(os.getenv("LIVE_STREAM_RESYNC_SECONDS", "5"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("LIVE_STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Every open stream pins one gunicorn thread for its whole life. Streams are
+# capped per worker so monitor tabs can't starve exam traffic, and each one
+# ends after STREAM_MAX_SECONDS (jittered) so EventSource reconnects and the
+# load spreads out again. Size the server so that
+#   workers x (GUNICORN_THREADS - LIVE_STREAM_MAX_PER_WORKER)
+# covers the normal request concurrency; e.g. the Procfile default of one
+# worker with 32 threads keeps 24 threads free next to 8 streams. With more
+# than one worker, run LIVE_STATE_BACKEND=redis so every worker's streams
+# see the same live state.
+STREAM_MAX_PER_WORKER = int(os.getenv("LIVE_STREAM_MAX_PER_WORKER", "8"))
+STREAM_MAX_SECONDS = float(os.getenv("LIVE_STREAM_MAX_SECONDS", "300"))
+STREAM_RETRY_MS = int(os.getenv("LIVE_STREAM_RETRY_MS", "3000"))
+POLL_INTERVAL_SECONDS = int(os.getenv("LIVE_POLL_INTERVAL_SECONDS", "5"))
+
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_PER_WORKER)
+
+
+def _with_live_state(roster):
+    # Students without an instructor assignment are left out, as before
+    states = live_state.get_states([s["student_id"] for s in roster])
+    return [{**s, **states[s["student_id"]]} for s in roster if s["student_id"] in states]
+
+
 @instructor_behavior_bp.route('/exam-assigned-students/<int:exam_id>', methods=['GET'])
 def get_assigned_students_for_exam(exam_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        roster = get_exam_roster(exam_id)
+        if roster is None:
+            return jsonify({"error": "Exam not found"}), 404
 
-        # Step 1: Get instructor_id from the exam
-        cursor.execute("SELECT instructor_id FROM exams WHERE id = %s", (exam_id,))
-        exam = cursor.fetchone()
+        return jsonify(_with_live_state(roster)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if not exam:
-            return jsonify({"error": "Exam not found"}), 404
 
-        instructor_id = exam["instructor_id"]
-
-        # Step 2: Correct join with instructor_id filter in WHERE
-        cursor.execute("""
-            SELECT 
-                u.id AS student_id,
-                u.name,
-                u.username,
-                MAX(ia.is_login) AS is_login,
-                MAX(ia.is_taking_exam) AS is_taking_exam,
-                MAX(ia.suspicious_behavior_count) AS suspicious_behavior_count,
-                MAX(ia.is_other_tab) AS is_other_tab
-            FROM exam_students es
-            JOIN users u ON es.student_id = u.id
-            JOIN instructor_assignments ia ON ia.student_id = u.id
-            WHERE es.exam_id = %s
-            GROUP BY u.id, u.name, u.username
-        """, (exam_id,))
-
-        students = cursor.fetchall()  
-        return jsonify(students), 200
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
 
+
+# Server-Sent Events: one "snapshot" event, then an "update" event per changed student.
+# When the worker is at its stream cap the client gets 503 and should poll
+# the plain endpoint (poll_url) instead.
+@instructor_behavior_bp.route('/exam-assigned-students/<int:exam_id>/stream', methods=['GET'])
+def stream_assigned_students(exam_id):
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({
+            "error": "Too many live streams, poll instead",
+            "poll_url": f"/api/exam-assigned-students/{exam_id}",
+            "poll_interval": POLL_INTERVAL_SECONDS,
+        }), 503, {"Retry-After": str(POLL_INTERVAL_SECONDS)}
+
+    released = threading.Event()
+
+    def release_slot():
+        if not released.is_set():
+            released.set()
+            _stream_slots.release()
+
+    try:
+        roster = get_exam_roster(exam_id)
     except Exception as e:
+        release_slot()
         return jsonify({"error": str(e)}), 500
+    if roster is None:
+        release_slot()
+        return jsonify({"error": "Exam not found"}), 404
+
+    by_id = {s["student_id"]: s for s in roster}
+    changes = live_state.subscribe()
+    lifetime = STREAM_MAX_SECONDS * random.uniform(0.8, 1.0)
+
+    def generate():
+        try:
+            students = _with_live_state(roster)
+            last_sent = {s["student_id"]: s for s in students}
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            yield _sse("snapshot", students)
+
+            started = last_resync = last_write = time.monotonic()
+            while time.monotonic() - started < lifetime:
+                changed = set()
+                try:
+                    changed.add(changes.get(timeout=STREAM_RESYNC_SECONDS))
+                    while True:
+                        changed.add(changes.get_nowait())
+                except queue.Empty:
+                    pass
+
+                if time.monotonic() - last_resync >= STREAM_RESYNC_SECONDS:
+                    changed = set(by_id)
+                    last_resync = time.monotonic()
+
+                changed &= set(by_id)
+                if changed:
+                    states = live_state.get_states(sorted(changed))
+                    for sid, state in states.items():
+                        current = {**by_id[sid], **state}
+                        if last_sent.get(sid) != current:
+                            last_sent[sid] = current
+                            last_write = time.monotonic()
+                            yield _sse("update", current)
+
+                if time.monotonic() - last_write >= STREAM_KEEPALIVE_SECONDS:
+                    last_write = time.monotonic()
+                    yield ": keep-alive\n\n"
+        finally:
+            live_state.unsubscribe(changes)
+            release_slot()
 
-    finally:
-        if conn:
-            conn.close()
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # also covers a client that disconnects before the first chunk is sent
+    response.call_on_close(release_slot)
+    response.call_on_close(lambda: live_state.unsubscribe(changes))
+    return response
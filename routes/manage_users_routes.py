@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify
 from database.connection import get_db_connection
+from services.instructor_services import invalidate_instructor_mapping
+from services.refresh_tokens import delete_account_tokens
+from services.behavior_counters import delete_counters
 
 manage_users_bp = Blueprint('manage_users', __name__)
 
@@ -53,9 +56,16 @@ def delete_user(user_id):
         # Optional: remove from student_profiles
         cursor.execute("DELETE FROM student_profiles WHERE user_id = %s", (user_id,))
 
+        # Sign the account out everywhere
+        delete_account_tokens(cursor, 'users', user_id)
+
+        # Behavior logs cascade with the user; their summary counters don't
+        delete_counters(cursor, user_id=user_id)
+
         # Then delete user
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
+        invalidate_instructor_mapping(user_id)
 
         return jsonify({"message": "User deleted successfully"}), 200
 
@@ -0,0 +1,30 @@
+# Attach capture-rate hints to behavior ingest responses
+import time
+from functools import wraps
+
+from flask import make_response
+
+from services.ingest_load import ingest_load
+
+
+def with_backpressure(view):
+    """
+    Time the ingest request and add the current load hints to its response:
+    a "backpressure" key on JSON bodies plus X-Capture-Interval /
+    X-Drop-Non-Critical headers for clients that don't parse the body.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        response = make_response(view(*args, **kwargs))
+        ingest_load.observe(time.monotonic() - started)
+
+        hints = ingest_load.hints()
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body["backpressure"] = hints
+            response.set_data(response.json_module.dumps(body))
+        response.headers["X-Capture-Interval"] = str(hints["capture_interval_ms"])
+        response.headers["X-Drop-Non-Critical"] = "1" if hints["drop_non_critical"] else "0"
+        return response
+    return wrapper
@@ -0,0 +1,83 @@
+# Keyset (timestamp, id) pagination and ?fields= selection for list endpoints
+import base64
+import os
+from datetime import datetime
+
+from flask import request
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+
+def page_limit():
+    """?limit= clamped to [1, MAX_PAGE_SIZE]. Raises ValueError on junk."""
+    raw = request.args.get("limit")
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(ts, row_id):
+    ts_text = ts.isoformat() if isinstance(ts, datetime) else str(ts or "")
+    return base64.urlsafe_b64encode(f"{ts_text}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (timestamp, id) from a cursor token, or None when no cursor was sent."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        ts_text, row_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return (datetime.fromisoformat(ts_text) if ts_text else None), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_condition(ts_col, id_col, cursor, descending=False):
+    """
+    SQL fragment (starting with AND) that resumes after `cursor`.
+    Written as an OR expansion rather than a row comparison so MySQL can
+    use a (…, ts_col, id_col) index range.
+    """
+    if cursor is None:
+        return "", ()
+    ts, row_id = cursor
+    op = "<" if descending else ">"
+    if ts is None:
+        return f" AND {id_col} {op} %s", (row_id,)
+    return (
+        f" AND ({ts_col} {op} %s OR ({ts_col} = %s AND {id_col} {op} %s))",
+        (ts, ts, row_id),
+    )
+
+
+def selected_fields(allowed, default=None):
+    """
+    Parse ?fields=a,b,c against the allowed names.
+    Returns the list of requested names (or `default`/all when absent).
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return list(default or allowed)
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def trim_page(rows, limit, ts_key="timestamp", id_key="id"):
+    """
+    Rows are fetched with LIMIT limit+1; drop the probe row and return
+    (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.get(ts_key), last[id_key])
@@ -0,0 +1,262 @@
+# services/account_service.py
+# Bulk student account creation: one duplicate check, bcrypt fanned out to a
+# process pool, multi-row inserts in a single transaction. Large imports run
+# in the background with their progress in student_import_jobs.
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from database.connection import get_db_connection
+from services.passwords import hash_password
+
+HASH_WORKERS = int(os.getenv("BCRYPT_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+BULK_CHUNK = int(os.getenv("BULK_CREATE_CHUNK", "200"))   # rows per hash batch / INSERT
+IN_CHUNK = 1000                                           # values per IN (...) list
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _hash_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: never fork a process that already runs flusher/poller threads
+            _pool = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def hash_passwords(passwords):
+    """bcrypt many passwords in parallel, preserving order."""
+    if len(passwords) <= 1:
+        return [hash_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    return list(_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _key(value):
+    """Comparison key matching the users table's case-insensitive collation."""
+    return str(value).strip().lower()
+
+
+def existing_usernames_emails(cursor, usernames, emails):
+    """
+    Return (set of taken usernames, set of taken emails) with IN queries.
+    Both sets hold _key() values, so compare them against _key(candidate).
+    """
+    taken_usernames, taken_emails = set(), set()
+    for column, values, taken in (("username", usernames, taken_usernames), ("email", emails, taken_emails)):
+        values = list({_key(v) for v in values})
+        for chunk in _chunks(values, IN_CHUNK):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"SELECT {column} FROM users WHERE {column} IN ({placeholders})", chunk)
+            taken.update(_key(row[0]) for row in cursor.fetchall())
+    return taken_usernames, taken_emails
+
+
+def select_new_students(cursor, students):
+    """
+    Drop rows with missing fields, repeats within the batch and accounts
+    that already exist (same rules as the old per-row loop).
+    """
+    complete = [
+        s for s in students
+        if all([s.get("name"), s.get("username"), s.get("email"), s.get("password")])
+    ]
+    taken_usernames, taken_emails = existing_usernames_emails(
+        cursor, {s["username"] for s in complete}, {s["email"] for s in complete}
+    )
+    fresh = []
+    for s in complete:
+        username, email = _key(s["username"]), _key(s["email"])
+        if username in taken_usernames or email in taken_emails:
+            continue
+        taken_usernames.add(username)
+        taken_emails.add(email)
+        fresh.append(s)
+    return fresh
+
+
+def _insert_chunk(cursor, chunk, hashes, meta):
+    tokens = [str(uuid.uuid4()) for _ in chunk]
+    cursor.execute(
+        """
+        INSERT INTO users (name, username, email, password, user_type, verify_token, is_verified)
+        VALUES """ + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(chunk)),
+        [v for s, pw, token in zip(chunk, hashes, tokens)
+         for v in (s["name"], s["username"], s["email"], pw, "Student", token, False)],
+    )
+
+    # map new ids back through the per-row verify tokens we just generated
+    cursor.execute(
+        f"SELECT id, verify_token FROM users WHERE verify_token IN ({', '.join(['%s'] * len(tokens))})",
+        tokens,
+    )
+    ids = dict((token, user_id) for user_id, token in cursor.fetchall())
+
+    cursor.execute(
+        """
+        INSERT INTO student_profiles (user_id, course, section, year, status)
+        VALUES """ + ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk)),
+        [v for token in tokens
+         for v in (ids[token], meta["course"], meta["section"], meta["year"], meta["status"])],
+    )
+
+    # Student info is returned for frontend email sending
+    return [
+        {
+            "name": s["name"],
+            "email": s["email"],
+            "username": s["username"],
+            "password": s["password"],
+            "verify_token": token,
+        }
+        for s, token in zip(chunk, tokens)
+    ]
+
+
+def bulk_create_students(students, meta, progress=None):
+    """
+    Create student accounts in one transaction. `progress` (a dict) is
+    updated after every chunk for background imports.
+    Returns the list of created students.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        fresh = select_new_students(cursor, students)
+        if progress is not None:
+            progress.update(total=len(students), to_create=len(fresh), skipped=len(students) - len(fresh))
+
+        created = []
+        for chunk in _chunks(fresh, BULK_CHUNK):
+            hashes = hash_passwords([s["password"] for s in chunk])
+            created.extend(_insert_chunk(cursor, chunk, hashes, meta))
+            if progress is not None:
+                progress["processed"] = len(created)
+
+        conn.commit()
+        return created
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# -------------------------------------------------------------
+# Background imports
+# -------------------------------------------------------------
+_JOB_FIELDS = ("status", "total", "to_create", "skipped", "processed", "created", "error", "result")
+
+
+def _update_job(job_id, **fields):
+    sets = ", ".join(f"{k} = %s" for k in fields if k in _JOB_FIELDS)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE student_import_jobs SET {sets} WHERE id = %s",
+            (*[v for k, v in fields.items() if k in _JOB_FIELDS], job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class _JobProgress(dict):
+    """Progress dict for bulk_create_students that is mirrored to the job row."""
+
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+
+    def update(self, **fields):
+        super().update(fields)
+        _update_job(self.job_id, **fields)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        _update_job(self.job_id, **{key: value})
+
+
+def start_bulk_import(students, meta):
+    """Run bulk_create_students on a background thread; returns a job id."""
+    job_id = uuid.uuid4().hex
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO student_import_jobs (id, status, total) VALUES (%s, 'running', %s)",
+            (job_id, len(students)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    def run():
+        try:
+            created = bulk_create_students(students, meta, _JobProgress(job_id))
+            _update_job(job_id, status="done", created=len(created), result=json.dumps(created))
+        except Exception as e:
+            print(f"[BULK_IMPORT_ERR] job {job_id}: {e}", file=sys.stderr, flush=True)
+            try:
+                _update_job(job_id, status="failed", error=str(e)[:1000])
+            except Exception as e2:
+                print(f"[BULK_IMPORT_ERR] job {job_id} status: {e2}", file=sys.stderr, flush=True)
+
+    threading.Thread(target=run, name=f"bulk-import-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def get_import_job(job_id):
+    """
+    Job progress for any worker. The created_students list (which carries the
+    initial passwords for the welcome emails) is handed out exactly once and
+    then wiped from the row.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT id AS job_id, status, total, to_create, skipped, processed, created, error,
+                   result, result_fetched_at, created_at, updated_at
+            FROM student_import_jobs
+            WHERE id = %s
+            FOR UPDATE
+        """, (job_id,))
+        job = cursor.fetchone()
+        if job is None:
+            conn.commit()
+            return None
+
+        result = job.pop("result")
+        if result is not None:
+            job["created_students"] = json.loads(result)
+            cursor.execute("""
+                UPDATE student_import_jobs
+                SET result = NULL, result_fetched_at = NOW()
+                WHERE id = %s
+            """, (job_id,))
+        elif job["result_fetched_at"] is not None:
+            job["created_students_delivered"] = True
+        conn.commit()
+        return job
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
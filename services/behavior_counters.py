@@ -0,0 +1,110 @@
+# services/behavior_counters.py
+# Per-(exam, user, warning_type, label) counters behind /get_exam_behavior_summary.
+# Unclassified logs are counted under label '' so the key can be a primary key.
+from collections import Counter
+
+_UPSERT_SQL = """
+    INSERT INTO behavior_log_counters (exam_id, user_id, warning_type, classification_label, log_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE log_count = GREATEST(log_count + VALUES(log_count), 0)
+"""
+
+
+def _key(exam_id, user_id, warning_type, label):
+    return (int(exam_id), int(user_id), warning_type or "Unknown", label or "")
+
+
+def apply_counter_deltas(cur, deltas):
+    """Apply {(exam_id, user_id, warning_type, label): delta} in one multi-row upsert."""
+    params = [(*key, delta) for key, delta in deltas.items() if delta]
+    if params:
+        cur.executemany(_UPSERT_SQL, params)
+
+
+def count_inserted(cur, rows):
+    """Bump counters for freshly inserted (exam_id, user_id, warning_type) rows."""
+    deltas = Counter(_key(exam_id, user_id, warning_type, None) for exam_id, user_id, warning_type in rows)
+    apply_counter_deltas(cur, deltas)
+
+
+def count_reclassified(cur, changes):
+    """
+    Move counts for reclassified logs.
+    `changes` holds (exam_id, user_id, warning_type, old_label, new_label).
+    """
+    deltas = Counter()
+    for exam_id, user_id, warning_type, old_label, new_label in changes:
+        if (old_label or "") == (new_label or ""):
+            continue
+        deltas[_key(exam_id, user_id, warning_type, old_label)] -= 1
+        deltas[_key(exam_id, user_id, warning_type, new_label)] += 1
+    apply_counter_deltas(cur, deltas)
+
+
+def delete_counters(cur, exam_id=None, user_id=None):
+    """
+    Drop the counters of a deleted exam or user (caller commits). The logs go
+    by ON DELETE CASCADE; the counter table has no FKs, so this keeps the two
+    in step.
+    """
+    if exam_id is not None:
+        cur.execute("DELETE FROM behavior_log_counters WHERE exam_id = %s", (exam_id,))
+    if user_id is not None:
+        cur.execute("DELETE FROM behavior_log_counters WHERE user_id = %s", (user_id,))
+
+
+def rebuild_counters(conn, exam_id=None):
+    """Recompute counters from suspicious_behavior_logs (all exams, or one)."""
+    cur = conn.cursor()
+    try:
+        where = "WHERE exam_id = %s" if exam_id is not None else ""
+        params = (exam_id,) if exam_id is not None else ()
+        cur.execute(f"DELETE FROM behavior_log_counters {where}", params)
+        cur.execute(f"""
+            INSERT INTO behavior_log_counters (exam_id, user_id, warning_type, classification_label, log_count)
+            SELECT exam_id, user_id, COALESCE(warning_type, 'Unknown'),
+                   COALESCE(classification_label, ''), COUNT(*)
+            FROM suspicious_behavior_logs
+            {where}
+            GROUP BY exam_id, user_id, COALESCE(warning_type, 'Unknown'), COALESCE(classification_label, '')
+        """, params)
+        conn.commit()
+        return cur.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def summarize(rows):
+    """
+    Fold grouped (user_id, warning_type, classification_label, log_count) rows
+    into the /get_exam_behavior_summary shape.
+    """
+    students = set()
+    suspicious = clean = 0
+    behavior_counts = Counter()
+    suspicious_by_student = Counter()
+
+    for row in rows:
+        count = int(row["log_count"])
+        if count <= 0:
+            continue
+        students.add(row["user_id"])
+        behavior_counts[row["warning_type"]] += count
+        if row["classification_label"] == "Suspicious":
+            suspicious += count
+            suspicious_by_student[row["user_id"]] += count
+        elif row["classification_label"] == "Clean":
+            clean += count
+
+    return {
+        "total_students": len(students),
+        "suspicious_count": suspicious,
+        "clean_count": clean,
+        "behavior_counts": dict(behavior_counts),
+        "top_students": [
+            {"user_id": uid, "count": n} for uid, n in suspicious_by_student.most_common()
+        ],
+    }
@@ -1,41 +1,143 @@
 # services/behavior_service.py
 from database.connection import get_db_connection
+from services.blob_store import get_blob_store
+from services.image_service import normalize_capture, normalize_pool
+from services.behavior_counters import count_inserted, count_reclassified
+import atexit
+import base64
+import binascii
+import os
+import queue
+import sys
 import threading
+import time
+import uuid
 
-def save_behavior_log(user_id: int, exam_id: int, image_base64: str, warning_type: str):
-    """Persist a behavior log. Returns inserted row id when available."""
+# -------------------------------------------------------------
+# Write-behind queue settings
+# -------------------------------------------------------------
+QUEUE_MAX = int(os.getenv("BEHAVIOR_QUEUE_MAX", "10000"))
+BATCH_SIZE = int(os.getenv("BEHAVIOR_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("BEHAVIOR_FLUSH_INTERVAL", "0.5"))  # seconds
+ENQUEUE_TIMEOUT = float(os.getenv("BEHAVIOR_ENQUEUE_TIMEOUT", "0.05"))  # seconds
+CLASSIFY_CHUNK = int(os.getenv("BEHAVIOR_CLASSIFY_CHUNK", "1000"))  # ids per IN (...) list
+FLUSH_RETRIES = int(os.getenv("BEHAVIOR_FLUSH_RETRIES", "3"))  # bulk insert attempts per batch
+FLUSH_BACKOFF = float(os.getenv("BEHAVIOR_FLUSH_BACKOFF", "0.2"))  # seconds, doubled per retry
+
+_INSERT_SQL = """
+    INSERT INTO suspicious_behavior_logs
+        (user_id, exam_id, image_hash, image_size, image_mime, thumb_hash, warning_type)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+_MAGIC_MIME = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+_returning_supported = None
+_dialect_lock = threading.Lock()
+
+
+def sniff_mime(data: bytes, default: str = "image/jpeg") -> str:
+    for magic, mime in _MAGIC_MIME:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+def decode_image_base64(image_base64: str):
+    """
+    Decode a base64 capture (plain or data: URL) into (bytes, mime).
+    Raises ValueError on malformed input.
+    """
+    header, sep, payload = image_base64.partition(",")
+    declared = None
+    if sep and header.startswith("data:"):
+        declared = header[5:].split(";", 1)[0] or None
+    else:
+        payload = image_base64
+    try:
+        data = base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid image_base64: {e}")
+    if not data:
+        raise ValueError("Invalid image_base64: empty image")
+    return data, declared or sniff_mime(data)
+
+
+def _supports_returning(conn) -> bool:
+    """
+    Decide once per process whether INSERT ... RETURNING is available
+    (MariaDB 10.5+). Plain MySQL never supports it, so we stop paying for a
+    failed statement on every insert.
+    """
+    global _returning_supported
+    if _returning_supported is None:
+        with _dialect_lock:
+            if _returning_supported is None:
+                info = (conn.get_server_info() or "").lower()
+                version = getattr(conn, "server_version", None) or (0, 0, 0)
+                _returning_supported = "mariadb" in info and tuple(version[:2]) >= (10, 5)
+    return _returning_supported
+
+
+def store_capture_blobs(data: bytes, mime: str):
+    """
+    Normalize a capture, write it and its thumbnail to the blob store.
+    Returns (image_hash, image_size, image_mime, thumb_hash).
+    """
+    store = get_blob_store()
+    full, normalized_mime, thumb = normalize_capture(data)
+    image_hash = store.put(full)
+    thumb_hash = store.put(thumb) if thumb else None
+    return image_hash, len(full), normalized_mime or mime, thumb_hash
+
+
+def _store_capture(user_id, exam_id, data: bytes, mime: str, warning_type):
+    """Write the image to the blob store and return the row parameters for _INSERT_SQL."""
+    return (user_id, exam_id, *store_capture_blobs(data, mime), warning_type)
+
+
+def _try_store_capture(row):
+    try:
+        return _store_capture(*row)
+    except Exception as e:
+        return e
+
+
+def store_captures(rows):
+    """
+    Normalize and store a batch of (user_id, exam_id, data, mime, warning_type)
+    captures in parallel on the capture pool. Returns one _INSERT_SQL parameter
+    tuple, or the exception that row raised, per input row.
+    """
+    if len(rows) <= 1:
+        return [_try_store_capture(row) for row in rows]
+    return list(normalize_pool().map(_try_store_capture, rows))
+
+
+def save_behavior_capture(user_id: int, exam_id: int, data: bytes, mime: str, warning_type: str):
+    """Persist a behavior capture from raw image bytes. Returns inserted row id when available."""
+    params = _store_capture(user_id, exam_id, data, mime, warning_type)
     conn = get_db_connection()
     cur = None
     try:
         cur = conn.cursor()
         row_id = None
-        try:
-            # Postgres path (supports RETURNING)
-            cur.execute(
-                """
-                INSERT INTO suspicious_behavior_logs (user_id, exam_id, image_base64, warning_type)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id
-                """,
-                (user_id, exam_id, image_base64, warning_type),
-            )
+        if _supports_returning(conn):
+            cur.execute(_INSERT_SQL + " RETURNING id", params)
             row = cur.fetchone()
             if row:
                 row_id = row[0]
-        except Exception:
-            # Fallback for MySQL/MariaDB (no RETURNING)
-            cur.execute(
-                """
-                INSERT INTO suspicious_behavior_logs (user_id, exam_id, image_base64, warning_type)
-                VALUES (%s, %s, %s, %s)
-                """,
-                (user_id, exam_id, image_base64, warning_type),
-            )
-            try:
-                row_id = getattr(cur, "lastrowid", None)
-            except Exception:
-                row_id = None
+        else:
+            cur.execute(_INSERT_SQL, params)
+            row_id = getattr(cur, "lastrowid", None)
 
+        count_inserted(cur, [(exam_id, user_id, warning_type)])
         conn.commit()
         return row_id
     except Exception:
@@ -48,12 +150,379 @@ def save_behavior_log(user_id: int, exam_id: int, image_base64: str, warning_typ
             pass
         conn.close()
 
-def save_behavior_log_async(user_id: int, exam_id: int, image_base64: str, warning_type: str, on_error=None):
-    """Fire-and-forget background insert so the WebRTC loop never blocks."""
-    def _worker():
+
+def save_behavior_log(user_id: int, exam_id: int, image_base64: str, warning_type: str):
+    """Persist a behavior log from a base64 capture. Returns inserted row id when available."""
+    data, mime = decode_image_base64(image_base64)
+    return save_behavior_capture(user_id, exam_id, data, mime, warning_type)
+
+
+def save_behavior_logs_bulk(rows) -> int:
+    """Insert many (user_id, exam_id, image_bytes, mime, warning_type) rows in one statement."""
+    params = store_captures(list(rows))
+    for p in params:
+        if isinstance(p, Exception):
+            raise p
+    return insert_behavior_rows(params)
+
+
+def insert_behavior_rows(params) -> int:
+    """Multi-row insert of already-stored captures (_INSERT_SQL parameter tuples)."""
+    if not params:
+        return 0
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor()
+        # mysql-connector rewrites executemany() on INSERT into a single multi-row INSERT
+        cur.executemany(_INSERT_SQL, params)
+        count_inserted(cur, [(p[1], p[0], p[-1]) for p in params])
+        conn.commit()
+        return len(params)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def classify_behavior_logs(labels, lease_id=None):
+    """
+    Apply {log_id: label} with one UPDATE ... WHERE id IN (...) per label and
+    chunk, moving the summary counters in the same transaction. Applying a
+    label also releases the row's classifier lease. With lease_id, rows no
+    longer leased to that id are left alone (another worker owns them now).
+    Returns (updated, unchanged, missing_ids, lost_lease_ids).
+    """
+    ids = list(labels)
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor()
+
+        # Lock the rows and read their current labels
+        current = {}
+        for chunk in _chunks(ids, CLASSIFY_CHUNK):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(f"""
+                SELECT id, exam_id, user_id, warning_type, classification_label, lease_owner
+                FROM suspicious_behavior_logs
+                WHERE id IN ({placeholders})
+                FOR UPDATE
+            """, chunk)
+            current.update((r[0], r[1:]) for r in cur.fetchall())
+
+        missing = [log_id for log_id in ids if log_id not in current]
+        lost = []
+        if lease_id is not None:
+            lost = [log_id for log_id, row in current.items() if row[4] not in (None, lease_id)]
+            for log_id in lost:
+                del current[log_id]
+        by_label = {}
+        changes = []
+        for log_id, (exam_id, user_id, warning_type, old_label, _owner) in current.items():
+            label = labels[log_id]
+            if old_label == label:
+                continue
+            by_label.setdefault(label, []).append(log_id)
+            changes.append((exam_id, user_id, warning_type, old_label, label))
+
+        for label, label_ids in by_label.items():
+            for chunk in _chunks(label_ids, CLASSIFY_CHUNK):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cur.execute(
+                    f"""
+                    UPDATE suspicious_behavior_logs
+                    SET classification_label = %s, lease_owner = NULL, lease_expires_at = NULL
+                    WHERE id IN ({placeholders})
+                    """,
+                    (label, *chunk),
+                )
+
+        count_reclassified(cur, changes)
+        conn.commit()
+        return len(changes), len(current) - len(changes), missing, lost
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         try:
-            save_behavior_log(user_id, exam_id, image_base64, warning_type)
-        except Exception as e:
-            if on_error:
-                on_error(e)
-    threading.Thread(target=_worker, daemon=True).start()
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+def lease_unclassified_logs(limit, lease_seconds):
+    """
+    Claim up to `limit` unclassified logs for one classifier worker.
+    SKIP LOCKED lets concurrent workers claim disjoint batches; rows come back
+    to the pool on their own once lease_expires_at passes.
+    Returns (lease_id, [{id, image_hash, image_base64, ...}]).
+    """
+    lease_id = uuid.uuid4().hex
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT id
+            FROM suspicious_behavior_logs
+            WHERE classification_label IS NULL
+              AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+              AND (image_hash IS NOT NULL OR image_base64 IS NOT NULL)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        ids = [r["id"] for r in cur.fetchall()]
+        if not ids:
+            conn.commit()
+            return lease_id, []
+
+        placeholders = ", ".join(["%s"] * len(ids))
+        cur.execute(f"""
+            UPDATE suspicious_behavior_logs
+            SET lease_owner = %s, lease_expires_at = NOW() + INTERVAL %s SECOND
+            WHERE id IN ({placeholders})
+        """, (lease_id, int(lease_seconds), *ids))
+        cur.execute(f"""
+            SELECT id, user_id, exam_id, warning_type, timestamp, image_hash, image_base64
+            FROM suspicious_behavior_logs
+            WHERE id IN ({placeholders})
+            ORDER BY id
+        """, ids)
+        logs = cur.fetchall()
+        conn.commit()
+        return lease_id, logs
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+def release_leases(lease_id, ids=None) -> int:
+    """Hand leased logs back early (all of a lease, or just `ids`)."""
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor()
+        sql = """
+            UPDATE suspicious_behavior_logs
+            SET lease_owner = NULL, lease_expires_at = NULL
+            WHERE lease_owner = %s
+        """
+        params = [lease_id]
+        if ids:
+            sql += f" AND id IN ({', '.join(['%s'] * len(ids))})"
+            params += list(ids)
+        cur.execute(sql, params)
+        conn.commit()
+        return cur.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+# -------------------------------------------------------------
+# Write-behind ingest queue
+# -------------------------------------------------------------
+class BehaviorLogQueue:
+    """
+    Bounded in-process buffer for behavior log rows.
+    A single flusher thread drains it with multi-row inserts whenever
+    BATCH_SIZE rows are waiting or FLUSH_INTERVAL has passed; image
+    normalization for a batch fans out to the capture pool.
+    """
+
+    def __init__(self, maxsize=QUEUE_MAX, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_worker(self):
+        # Started lazily (and per pid) so gunicorn workers each get their own flusher.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="behavior-log-flusher", daemon=True)
+                self._thread.start()
+
+    def put(self, user_id, exam_id, data, mime, warning_type, timeout=ENQUEUE_TIMEOUT) -> bool:
+        """Queue a decoded capture. Returns False when the buffer is full (caller should back off)."""
+        self._ensure_worker()
+        try:
+            self._queue.put((user_id, exam_id, data, mime, warning_type), timeout=timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def is_full(self) -> bool:
+        return self._queue.full()
+
+    def _take_batch(self, wait):
+        batch = []
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _store(self, batch):
+        """Write each capture to the blob store; a bad image only loses its own row."""
+        params = []
+        for row, stored in zip(batch, store_captures(batch)):
+            if isinstance(stored, Exception):
+                self.failed += 1
+                print(f"[BEHAVIOR_FLUSH_ERR] dropped capture for user {row[0]}: {stored}", file=sys.stderr, flush=True)
+            else:
+                params.append(stored)
+        return params
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        params = self._store(batch)
+
+        # Transient errors (deadlock, pool timeout): retry the whole batch with backoff
+        for attempt in range(FLUSH_RETRIES):
+            try:
+                self.flushed += insert_behavior_rows(params)
+                return
+            except Exception as e:
+                print(f"[BEHAVIOR_FLUSH_RETRY] attempt {attempt + 1}/{FLUSH_RETRIES} "
+                      f"for {len(params)} rows: {e}", file=sys.stderr, flush=True)
+                if attempt + 1 < FLUSH_RETRIES:
+                    time.sleep(FLUSH_BACKOFF * (2 ** attempt))
+
+        # Still failing: insert row by row so one bad row can't take the batch with it
+        for p in params:
+            try:
+                self.flushed += insert_behavior_rows([p])
+            except Exception as e:
+                self.failed += 1
+                print(f"[BEHAVIOR_FLUSH_ERR] dropped row for user {p[0]} exam {p[1]}: {e}",
+                      file=sys.stderr, flush=True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._flush(self._take_batch(self.flush_interval))
+
+    def drain(self, timeout=10.0):
+        """Stop the flusher and write out everything still buffered."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=timeout)
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            self._flush(self._take_batch(0))
+
+
+behavior_log_queue = BehaviorLogQueue()
+atexit.register(behavior_log_queue.drain)
+
+
+def save_behavior_capture_async(user_id: int, exam_id: int, data: bytes, mime: str, warning_type: str, on_error=None):
+    """Queue raw image bytes for the write-behind flusher. Returns False if the queue is full."""
+    accepted = behavior_log_queue.put(user_id, exam_id, data, mime, warning_type)
+    if not accepted and on_error:
+        on_error(queue.Full("behavior log queue is full"))
+    return accepted
+
+
+def save_behavior_log_async(user_id: int, exam_id: int, image_base64: str, warning_type: str, on_error=None):
+    """Queue the row for the write-behind flusher so the WebRTC loop never blocks."""
+    data, mime = decode_image_base64(image_base64)
+    return save_behavior_capture_async(user_id, exam_id, data, mime, warning_type, on_error)
+
+
+# -------------------------------------------------------------
+# Read helpers
+# -------------------------------------------------------------
+def behavior_image_url(blob_hash: str) -> str:
+    return f"/api/behavior-image/{blob_hash}"
+
+
+def behavior_log_image_url(log_id, size="full") -> str:
+    suffix = "?size=thumb" if size == "thumb" else ""
+    return f"/api/behavior-log-image/{log_id}{suffix}"
+
+
+def attach_image_urls(rows):
+    """
+    Give each row a thumbnail_url for galleries and an image_url for the full
+    frame. Legacy rows that still hold inline base64 (flagged by
+    has_inline_image) are served through the per-log endpoint.
+    """
+    for row in rows:
+        blob_hash = row.pop("image_hash", None)
+        thumb_hash = row.pop("thumb_hash", None)
+        has_inline = row.pop("has_inline_image", None) or row.pop("image_base64", None)
+
+        if blob_hash:
+            row["image_url"] = behavior_image_url(blob_hash)
+        elif has_inline and "id" in row:
+            row["image_url"] = behavior_log_image_url(row["id"])
+        else:
+            row["image_url"] = None
+
+        if thumb_hash:
+            row["thumbnail_url"] = behavior_image_url(thumb_hash)
+        elif row["image_url"] and "id" in row:
+            row["thumbnail_url"] = behavior_log_image_url(row["id"], "thumb")
+        else:
+            row["thumbnail_url"] = row["image_url"]
+    return rows
+
+
+def inline_image_base64(rows):
+    """Fill image_base64 from the blob store for callers that still need inline images."""
+    store = get_blob_store()
+    for row in rows:
+        blob_hash = row.pop("image_hash", None)
+        if blob_hash and not row.get("image_base64"):
+            try:
+                row["image_base64"] = base64.b64encode(store.read(blob_hash)).decode("ascii")
+            except FileNotFoundError:
+                row["image_base64"] = None
+    return rows
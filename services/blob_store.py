@@ -0,0 +1,109 @@
+# services/blob_store.py
+# Content-addressed storage for behavior capture images.
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(os.getcwd(), "uploads", "behavior"))
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_hash(blob_hash: str) -> bool:
+    return bool(blob_hash) and bool(_HASH_RE.match(blob_hash))
+
+
+class BlobStore(ABC):
+    """Interface every backend implements. Blobs are keyed by their sha256 hex digest."""
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def exists(self, blob_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def open(self, blob_hash: str):
+        """Return a binary file-like object for streaming the blob."""
+
+    def read(self, blob_hash: str) -> bytes:
+        with self.open(blob_hash) as f:
+            return f.read()
+
+    @abstractmethod
+    def delete(self, blob_hash: str) -> None:
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Filesystem backend sharded by hash prefix: <root>/ab/cd/abcd....
+    Identical images are written once; writes go through a temp file and
+    os.replace() so readers never see a partial blob.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, blob_hash: str) -> str:
+        if not is_valid_hash(blob_hash):
+            raise ValueError(f"Invalid blob hash: {blob_hash!r}")
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, data: bytes) -> str:
+        blob_hash = hashlib.sha256(data).hexdigest()
+        target = self.path(blob_hash)
+        if os.path.exists(target):
+            return blob_hash
+
+        shard = os.path.dirname(target)
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=shard, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return blob_hash
+
+    def exists(self, blob_hash: str) -> bool:
+        return is_valid_hash(blob_hash) and os.path.isfile(self.path(blob_hash))
+
+    def open(self, blob_hash: str):
+        return open(self.path(blob_hash), "rb")
+
+    def delete(self, blob_hash: str) -> None:
+        try:
+            os.remove(self.path(blob_hash))
+        except FileNotFoundError:
+            pass
+
+
+_BACKENDS = {
+    "local": LocalBlobStore,
+}
+
+_store = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store selected by BLOB_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        try:
+            backend = _BACKENDS[BLOB_STORE_BACKEND]
+        except KeyError:
+            raise RuntimeError(f"Unknown BLOB_STORE_BACKEND '{BLOB_STORE_BACKEND}'")
+        _store = backend()
+    return _store
@@ -0,0 +1,138 @@
+# services/cache.py
+# Small thread-safe in-process caches shared by the services.
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+# name -> SingleFlight, for /cache_stats
+_flights = {}
+
+
+class TTLCache:
+    """
+    Dict-like cache whose entries expire after `ttl` seconds.
+    Oldest entries are evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, ttl, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate):
+        """Drop every entry whose key matches `predicate(key)`."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution of `fn`:
+    the first caller runs it, the rest wait for its result (or exception).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+        _flights[name] = self
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+def cached_single_flight(cache, flight, key, fn):
+    """Serve `key` from `cache`; on a miss run `fn` once for all concurrent callers."""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    def load():
+        result = fn()
+        cache.set(key, result)
+        return result
+
+    return flight.do(key, load)
+
+
+def flight_stats():
+    return {
+        name: {"executions": f.executions, "coalesced": f.coalesced}
+        for name, f in _flights.items()
+    }
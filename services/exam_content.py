@@ -0,0 +1,216 @@
+# services/exam_content.py
+# Exam questions + options loaded in two queries and cached per content version.
+# exams.content_version is bumped in the same transaction as any question
+# write, so every worker notices edits within VERSION_CHECK_SECONDS.
+import os
+from database.connection import get_db_connection
+from services.cache import SingleFlight, TTLCache, cached_single_flight
+
+VERSION_CHECK_SECONDS = float(os.getenv("EXAM_VERSION_CHECK_SECONDS", "2"))
+CONTENT_TTL = float(os.getenv("EXAM_CONTENT_TTL", "3600"))           # seconds
+CONTENT_CACHE_SIZE = int(os.getenv("EXAM_CONTENT_CACHE_SIZE", "256"))
+INSTRUCTIONS_TTL = float(os.getenv("EXAM_INSTRUCTIONS_TTL", "30"))   # seconds
+ROSTER_TTL = float(os.getenv("EXAM_ROSTER_TTL", "30"))               # seconds
+
+_MISSING = object()
+
+_versions = TTLCache(ttl=VERSION_CHECK_SECONDS)                        # exam_id -> version
+_content = TTLCache(ttl=CONTENT_TTL, maxsize=CONTENT_CACHE_SIZE)      # (exam_id, version, answers) -> questions
+_flight = SingleFlight("exam_questions")
+
+_instructions = TTLCache(ttl=INSTRUCTIONS_TTL)                        # exam_id -> text
+_instructions_flight = SingleFlight("exam_instructions")
+
+_rosters = TTLCache(ttl=ROSTER_TTL)                                   # exam_id -> roster or None
+_roster_flight = SingleFlight("exam_roster")
+
+
+def _current_version(cursor, exam_id):
+    cursor.execute("SELECT content_version FROM exams WHERE id = %s", (exam_id,))
+    row = cursor.fetchone()
+    return row["content_version"] if row else None   # None: exam deleted / unknown
+
+
+def _load_questions(cursor, exam_id):
+    """Questions and all their options in two queries, shaped like the old per-question loop."""
+    cursor.execute("SELECT * FROM exam_questions WHERE exam_id = %s ORDER BY id", (exam_id,))
+    questions = cursor.fetchall()
+    if not questions:
+        return []
+
+    cursor.execute("""
+        SELECT o.id, o.question_id, o.option_text, o.is_correct
+        FROM exam_options o
+        JOIN exam_questions q ON q.id = o.question_id
+        WHERE q.exam_id = %s
+        ORDER BY o.id
+    """, (exam_id,))
+    options_by_question = {}
+    for opt in cursor.fetchall():
+        options_by_question.setdefault(opt.pop("question_id"), []).append({
+            "id": opt["id"],
+            "option_text": str(opt["option_text"]),
+            "is_correct": bool(opt["is_correct"]),
+        })
+
+    for q in questions:
+        qtype = q.get("question_type", "mcq")
+        if qtype == "mcq":
+            options = options_by_question.get(q["id"], [])
+            q["options"] = options
+            q["correct_answer"] = next(
+                (i for i, opt in enumerate(options) if opt["is_correct"]), None
+            )
+        elif qtype == "identification":
+            q["options"] = []
+            # keep the stored text from DB
+            q["correct_answer"] = q.get("correct_answer")
+        else:  # essay or others
+            q["options"] = []
+            q["correct_answer"] = None
+    return questions
+
+
+def _strip_answers(questions):
+    """Student view: no correct_answer and no is_correct flags."""
+    return [
+        {
+            **{k: v for k, v in q.items() if k != "correct_answer"},
+            "options": [{"id": o["id"], "option_text": o["option_text"]} for o in q["options"]],
+        }
+        for q in questions
+    ]
+
+
+def get_exam_questions(exam_id, with_answers=True):
+    """
+    Return the assembled question list for an exam (cached, treat as read-only).
+    with_answers=False drops answer keys for the student-facing view.
+    """
+    exam_id = int(exam_id)
+    version = _versions.get(exam_id, _MISSING)
+    if version is not _MISSING:
+        cached = _content.get((exam_id, version, bool(with_answers)), _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+    # Everyone opening the exam at once shares one DB fetch
+    return _flight.do((exam_id, bool(with_answers)), lambda: _fetch_questions(exam_id, with_answers))
+
+
+def _fetch_questions(exam_id, with_answers):
+    version = _versions.get(exam_id, _MISSING)
+    key = (exam_id, version, bool(with_answers))
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        if version is _MISSING:
+            version = _current_version(cursor, exam_id)
+            _versions.set(exam_id, version)
+            key = (exam_id, version, bool(with_answers))
+            cached = _content.get(key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
+        full = _content.get((exam_id, version, True), _MISSING)
+        if full is _MISSING:
+            full = _load_questions(cursor, exam_id)
+            _content.set((exam_id, version, True), full)
+    finally:
+        conn.close()
+
+    if with_answers:
+        return full
+    stripped = _strip_answers(full)
+    _content.set(key, stripped)
+    return stripped
+
+
+def bump_content_version(cursor, exam_id):
+    """Call inside the transaction that changes an exam's questions or options."""
+    cursor.execute(
+        "UPDATE exams SET content_version = content_version + 1 WHERE id = %s",
+        (exam_id,),
+    )
+
+
+def invalidate_exam_content(exam_id):
+    """Drop this worker's cached copies right away (after commit)."""
+    exam_id = int(exam_id)
+    _versions.pop(exam_id)
+    _content.pop_where(lambda key: key[0] == exam_id)
+
+
+def _fetch_instructions(exam_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT instructions FROM exam_instructions WHERE exam_id = %s LIMIT 1",
+            (exam_id,),
+        )
+        row = cursor.fetchone()
+        return row["instructions"] if row else ""
+    finally:
+        conn.close()
+
+
+def get_exam_instructions(exam_id):
+    """Instructions text for an exam ("" if none); cached and single-flighted."""
+    exam_id = int(exam_id)
+    return cached_single_flight(
+        _instructions, _instructions_flight, exam_id, lambda: _fetch_instructions(exam_id)
+    )
+
+
+def invalidate_exam_instructions(exam_id):
+    _instructions.pop(int(exam_id))
+
+
+def _fetch_roster(exam_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+
+        # Step 1: Make sure the exam exists
+        cursor.execute("SELECT instructor_id FROM exams WHERE id = %s", (exam_id,))
+        if not cursor.fetchone():
+            return None
+
+        # Step 2: Roster only; live flags come from the live state store
+        cursor.execute("""
+            SELECT 
+                u.id AS student_id,
+                u.name,
+                u.username
+            FROM exam_students es
+            JOIN users u ON es.student_id = u.id
+            WHERE es.exam_id = %s
+        """, (exam_id,))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def get_exam_roster(exam_id):
+    """Students enrolled in the exam, or None if the exam does not exist."""
+    exam_id = int(exam_id)
+    return cached_single_flight(_rosters, _roster_flight, exam_id, lambda: _fetch_roster(exam_id))
+
+
+def invalidate_exam_roster(exam_id):
+    _rosters.pop(int(exam_id))
+
+
+def prime_exam(exam_id, hold_seconds):
+    """
+    Load everything students and proctors read at exam start, keeping the
+    short-TTL entries for at least `hold_seconds`. Returns the roster.
+    """
+    exam_id = int(exam_id)
+    get_exam_questions(exam_id, with_answers=True)
+    get_exam_questions(exam_id, with_answers=False)
+    _instructions.set(exam_id, _fetch_instructions(exam_id), ttl=max(hold_seconds, INSTRUCTIONS_TTL))
+    roster = _fetch_roster(exam_id)
+    _rosters.set(exam_id, roster, ttl=max(hold_seconds, ROSTER_TTL))
+    return roster or []
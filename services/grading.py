@@ -0,0 +1,125 @@
+# services/grading.py
+# QA exam grading against a per-exam answer key compiled once from the
+# cached question list (services/exam_content.py), plus one-statement
+# persistence of the graded answers.
+import re
+from services.cache import TTLCache
+from services.exam_content import get_exam_questions
+
+# exam_id -> (question list it was compiled from, AnswerKey)
+_compiled = TTLCache(ttl=3600, maxsize=256)
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_answer(text):
+    """Identification answers compare case-insensitively, ignoring extra whitespace."""
+    return _SPACES.sub(" ", (text or "").strip()).casefold()
+
+
+class QuestionKey:
+    __slots__ = ("id", "type", "text", "options", "correct_text", "normalized")
+
+    def __init__(self, q):
+        self.id = q["id"]
+        self.type = q.get("question_type", "mcq")
+        self.text = q["question_text"]
+        # option_id -> (option_text, is_correct)
+        self.options = {o["id"]: (o["option_text"], o["is_correct"]) for o in q.get("options", [])}
+        if self.type == "mcq":
+            self.correct_text = next((t for t, ok in self.options.values() if ok), None)
+        elif self.type == "identification":
+            self.correct_text = q.get("correct_answer")
+        else:
+            self.correct_text = None
+        self.normalized = normalize_answer(self.correct_text) if self.correct_text else None
+
+
+class AnswerKey:
+    def __init__(self, exam_id, questions):
+        self.exam_id = exam_id
+        self.questions = [QuestionKey(q) for q in questions]
+
+    @property
+    def total(self):
+        return len(self.questions)
+
+
+def get_answer_key(exam_id):
+    """Compiled key for the exam's current content version."""
+    exam_id = int(exam_id)
+    questions = get_exam_questions(exam_id, with_answers=True)
+    cached = _compiled.get(exam_id)
+    # the question list object only changes when the content version does
+    if cached and cached[0] is questions:
+        return cached[1]
+    key = AnswerKey(exam_id, questions)
+    _compiled.set(exam_id, (questions, key))
+    return key
+
+
+def grade_answers(key, answers):
+    """
+    Grade {question_id (str): answer} against `key`.
+    Returns (score, rows, review); rows are
+    (question_id, selected_option_id, selected_text, essay_answer, is_correct).
+    """
+    score = 0
+    rows = []
+    review = []
+    for q in key.questions:
+        student_answer = answers.get(str(q.id))
+        selected_option_id = selected_text = essay_answer = is_correct = None
+
+        if q.type == "mcq":
+            selected_option_id = student_answer
+            option = q.options.get(student_answer) if isinstance(student_answer, int) else None
+            selected_text = option[0] if option else None
+            is_correct = 1 if (option and option[1]) else 0
+        elif q.type == "identification":
+            selected_text = (student_answer or "").strip()
+            is_correct = 1 if q.normalized and normalize_answer(selected_text) == q.normalized else 0
+        elif q.type == "essay":
+            essay_answer = (student_answer or "").strip()   # manual grading
+
+        if is_correct:
+            score += 1
+        rows.append((q.id, selected_option_id, selected_text, essay_answer, is_correct))
+        review.append({
+            "question_id": q.id,
+            "question_text": q.text,
+            "question_type": q.type,
+            "selected_answer": essay_answer if q.type == "essay" else selected_text,
+            "correct_answer": q.correct_text,
+            "is_correct": (None if is_correct is None else bool(is_correct)),
+        })
+    return score, rows, review
+
+
+def save_graded_submission(cursor, user_id, exam_id, score, total_score, rows, submitted_at):
+    """Upsert the submission with its final score, then all answers in one statement."""
+    cursor.execute("""
+        INSERT INTO exam_submissions (user_id, exam_id, score, total_score, submitted_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            score = VALUES(score),
+            total_score = VALUES(total_score),
+            submitted_at = VALUES(submitted_at),
+            id = LAST_INSERT_ID(id)
+    """, (user_id, exam_id, score, total_score, submitted_at))
+    submission_id = cursor.lastrowid
+
+    if rows:
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+        params = [v for row in rows for v in (submission_id, *row)]
+        cursor.execute(f"""
+            INSERT INTO exam_answers
+              (submission_id, question_id, selected_option_id, selected_text, essay_answer, is_correct)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE
+              selected_option_id = VALUES(selected_option_id),
+              selected_text = VALUES(selected_text),
+              essay_answer = VALUES(essay_answer),
+              is_correct = VALUES(is_correct)
+        """, params)
+    return submission_id
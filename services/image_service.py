@@ -0,0 +1,65 @@
+# services/image_service.py
+# Normalize behavior captures and build review thumbnails.
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+MAX_DIMENSION = int(os.getenv("CAPTURE_MAX_DIMENSION", "1280"))
+CAPTURE_QUALITY = int(os.getenv("CAPTURE_JPEG_QUALITY", "80"))
+THUMB_DIMENSION = int(os.getenv("CAPTURE_THUMB_DIMENSION", "240"))
+THUMB_QUALITY = int(os.getenv("CAPTURE_THUMB_QUALITY", "70"))
+# Pillow releases the GIL while decoding/resizing/encoding, so threads scale
+NORMALIZE_WORKERS = int(os.getenv("CAPTURE_NORMALIZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def normalize_pool():
+    """Per-process thread pool for CPU-bound capture work."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=NORMALIZE_WORKERS, thread_name_prefix="capture-normalize")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _encode_jpeg(img, quality) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def normalize_capture(data: bytes):
+    """
+    Re-encode a capture as JPEG bounded to MAX_DIMENSION and build a thumbnail.
+    Returns (full_bytes, mime, thumb_bytes). If the bytes are not a readable
+    image the original is kept and no thumbnail is produced.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+
+            full = img.copy()
+            full.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+            full_bytes = _encode_jpeg(full, CAPTURE_QUALITY)
+
+            thumb = full.copy()
+            thumb.thumbnail((THUMB_DIMENSION, THUMB_DIMENSION))
+            thumb_bytes = _encode_jpeg(thumb, THUMB_QUALITY)
+    except Exception as e:
+        print(f"[CAPTURE_NORMALIZE_ERR] storing original: {e}", file=sys.stderr, flush=True)
+        return data, None, None
+
+    # Never grow an already small/compressed capture
+    if len(full_bytes) >= len(data) and max(full.size) >= max(img.size):
+        return data, None, thumb_bytes
+    return full_bytes, "image/jpeg", thumb_bytes
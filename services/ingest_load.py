@@ -0,0 +1,61 @@
+# services/ingest_load.py
+# Load signal for the behavior ingest path: write-behind queue depth plus a
+# moving average of request latency. Used to tell clients how fast to capture
+# and to shed repeated frames server-side when over capacity.
+import os
+import threading
+from services.behavior_service import QUEUE_MAX, behavior_log_queue
+from services.cache import TTLCache
+
+TARGET_LATENCY = float(os.getenv("INGEST_TARGET_LATENCY", "0.2"))         # seconds
+BASE_CAPTURE_INTERVAL_MS = int(os.getenv("BASE_CAPTURE_INTERVAL_MS", "1000"))
+MAX_CAPTURE_INTERVAL_MS = int(os.getenv("MAX_CAPTURE_INTERVAL_MS", "10000"))
+SHED_THRESHOLD = float(os.getenv("INGEST_SHED_THRESHOLD", "0.7"))         # load 0..1
+SHED_WINDOW = float(os.getenv("INGEST_SHED_WINDOW", "10"))                # seconds
+LATENCY_ALPHA = 0.2   # weight of the newest sample in the moving average
+
+
+class IngestLoadMonitor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = 0.0
+        self.shed = 0
+        # (user_id, exam_id, warning_type) seen within SHED_WINDOW
+        self._recent = TTLCache(ttl=SHED_WINDOW, maxsize=50000)
+
+    def observe(self, seconds):
+        with self._lock:
+            self.latency += LATENCY_ALPHA * (seconds - self.latency)
+
+    def load(self):
+        """0 = idle, 1 = at capacity (either the queue or latency target)."""
+        queue_load = behavior_log_queue.depth() / max(QUEUE_MAX, 1)
+        latency_load = self.latency / TARGET_LATENCY if TARGET_LATENCY > 0 else 0
+        return max(queue_load, latency_load)
+
+    def overloaded(self):
+        return self.load() >= SHED_THRESHOLD
+
+    def hints(self):
+        load = round(self.load(), 2)
+        interval = min(BASE_CAPTURE_INTERVAL_MS * (1 + 3 * load), MAX_CAPTURE_INTERVAL_MS)
+        return {
+            "load": load,
+            "capture_interval_ms": int(interval),
+            "drop_non_critical": load >= SHED_THRESHOLD,
+        }
+
+    def should_shed(self, user_id, exam_id, warning_type):
+        """
+        True for a repeat of the same warning_type from the same student within
+        SHED_WINDOW while over capacity. The first frame of a kind always passes.
+        """
+        key = (int(user_id), int(exam_id), warning_type)
+        if key in self._recent and self.overloaded():
+            self.shed += 1
+            return True
+        self._recent.set(key, True)
+        return False
+
+
+ingest_load = IngestLoadMonitor()
@@ -1,7 +1,69 @@
-# services/instructor_service.py increment if the suspicous capture 
+# services/instructor_services.py
+# Cached student -> instructor mapping used to scope live_state writes to one
+# instructor_assignments row.
 from database.connection import get_db_connection
-import threading
+from services.cache import TTLCache
+import os
 import sys
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # optional shared backend
+    redis = None
+
+# Each worker caches its own mappings. With LIVE_STATE_BACKEND=redis an
+# (un)assign in one worker bumps a shared generation and every worker drops
+# its cache within MAPPING_SYNC_SECONDS. With the memory backend other workers
+# only notice on expiry, so MAPPING_TTL also caps prewarmed entries there.
+MAPPING_TTL = float(os.getenv("INSTRUCTOR_MAPPING_TTL", "30"))       # seconds
+MAPPING_SYNC_SECONDS = float(os.getenv("INSTRUCTOR_MAPPING_SYNC_SECONDS", "1"))
+SHARED_BACKEND = os.getenv("LIVE_STATE_BACKEND", "memory") == "redis"
+REDIS_URL = os.getenv("LIVE_STATE_REDIS_URL", "redis://localhost:6379/0")
+GENERATION_KEY = "proctorvision:instructor_map:gen"
+
+# student_id -> latest instructor_id (None when the student has no assignment)
+_instructor_cache = TTLCache(ttl=MAPPING_TTL)
+
+_UNCHECKED = object()
+_redis = None
+_seen_generation = _UNCHECKED
+_generation_checked_at = 0.0
+_sync_lock = threading.Lock()
+
+
+def _shared():
+    global _redis
+    if not SHARED_BACKEND:
+        return None
+    if _redis is None:
+        if redis is None:
+            raise RuntimeError("LIVE_STATE_BACKEND=redis requires the 'redis' package")
+        _redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def _sync_generation():
+    """Drop this worker's mappings if another worker invalidated since the last check."""
+    global _seen_generation, _generation_checked_at
+    if not SHARED_BACKEND:
+        return
+    with _sync_lock:
+        now = time.monotonic()
+        if now - _generation_checked_at < MAPPING_SYNC_SECONDS:
+            return
+        _generation_checked_at = now
+        try:
+            generation = _shared().get(GENERATION_KEY)
+        except Exception as e:
+            print(f"[INSTRUCTOR_MAP_SYNC_ERR] {e}", file=sys.stderr, flush=True)
+            return
+        if generation != _seen_generation:
+            if _seen_generation is not _UNCHECKED:     # first check only records it
+                _instructor_cache.clear()
+            _seen_generation = generation
+
 
 def _find_instructor_id_for_student(conn, student_id: int):
     """
@@ -26,68 +88,66 @@ def _find_instructor_id_for_student(conn, student_id: int):
     finally:
         cur.close()
 
-def increment_suspicious(student_id: int, instructor_id: int) -> int:
-    """Direct bump: requires instructor_id; returns affected rows."""
-    conn = get_db_connection()
-    cur = None
+
+def get_instructor_id_for_student(student_id: int, conn=None):
+    """Cached student -> instructor lookup; invalidated by (un)assign routes."""
+    student_id = int(student_id)
+    _sync_generation()
+    if student_id in _instructor_cache:
+        return _instructor_cache.get(student_id)
+
+    own_conn = conn is None
+    conn = conn or get_db_connection()
     try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            UPDATE instructor_assignments
-            SET suspicious_behavior_count = suspicious_behavior_count + 1
-            WHERE student_id = %s AND instructor_id = %s
-            """,
-            (student_id, instructor_id),
-        )
-        conn.commit()
-        return cur.rowcount
-    except Exception:
-        try: conn.rollback()
-        except Exception: pass
-        raise
+        iid = _find_instructor_id_for_student(conn, student_id)
     finally:
-        try: cur.close()
-        except Exception: pass
-        conn.close()
+        if own_conn:
+            conn.close()
+    _instructor_cache.set(student_id, iid)
+    return iid
 
-def increment_suspicious_for_student(student_id: int) -> int:
-    """
-    Convenience: look up instructor_id for the student and bump the count.
-    Returns affected rows (0 if no assignment found).
-    """
+
+def prime_instructor_mappings(student_ids, ttl=None):
+    """Load the latest instructor for many students in one query."""
+    student_ids = [int(s) for s in student_ids]
+    if not student_ids:
+        return
+    _sync_generation()
     conn = get_db_connection()
     cur = None
     try:
-        iid = _find_instructor_id_for_student(conn, student_id)
-        if iid is None:
-            return 0
         cur = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(student_ids))
         cur.execute(
-            """
-            UPDATE instructor_assignments
-            SET suspicious_behavior_count = suspicious_behavior_count + 1
-            WHERE student_id = %s AND instructor_id = %s
+            f"""
+            SELECT student_id, instructor_id
+            FROM instructor_assignments
+            WHERE student_id IN ({placeholders})
+            ORDER BY id
             """,
-            (student_id, iid),
+            student_ids,
         )
-        conn.commit()
-        return cur.rowcount
-    except Exception:
-        try: conn.rollback()
-        except Exception: pass
-        raise
+        latest = dict.fromkeys(student_ids)
+        for student_id, instructor_id in cur.fetchall():
+            latest[student_id] = instructor_id   # ascending ids: last one wins
     finally:
         try: cur.close()
         except Exception: pass
         conn.close()
+    if not SHARED_BACKEND and ttl is not None:
+        ttl = min(ttl, MAPPING_TTL)     # no cross-worker invalidation to rely on
+    for student_id, instructor_id in latest.items():
+        _instructor_cache.set(student_id, instructor_id, ttl=ttl)
+
 
-def increment_suspicious_for_student_async(student_id: int, on_error=None):
-    """Fire-and-forget background increment."""
-    def _worker():
+def invalidate_instructor_mapping(student_id=None):
+    """Forget cached mappings for one student (or everyone), in every worker."""
+    if student_id is None:
+        _instructor_cache.clear()
+    else:
+        _instructor_cache.pop(int(student_id))
+    if SHARED_BACKEND:
         try:
-            increment_suspicious_for_student(student_id)
+            _shared().incr(GENERATION_KEY)
         except Exception as e:
-            if on_error: on_error(e)
-            else: print(f"[INCR_SUSPICIOUS_ERR] {e}", file=sys.stderr, flush=True)
-    threading.Thread(target=_worker, daemon=True).start()
+            print(f"[INSTRUCTOR_MAP_SYNC_ERR] {e}", file=sys.stderr, flush=True)
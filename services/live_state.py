@@ -0,0 +1,437 @@
+# services/live_state.py
+# Live proctoring flags (instructor_assignments.is_login / is_taking_exam /
+# is_other_tab / suspicious_behavior_count) held in memory during exams and
+# flushed to MySQL in coalesced batches.
+from database.connection import get_db_connection
+from services.instructor_services import get_instructor_id_for_student
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # optional shared backend
+    redis = None
+
+FLAG_FIELDS = ("is_login", "is_taking_exam", "is_other_tab")
+COUNT_FIELD = "suspicious_behavior_count"
+
+LIVE_STATE_BACKEND = os.getenv("LIVE_STATE_BACKEND", "memory")   # memory | redis
+LIVE_STATE_REDIS_URL = os.getenv("LIVE_STATE_REDIS_URL", "redis://localhost:6379/0")
+FLUSH_INTERVAL = float(os.getenv("LIVE_STATE_FLUSH_INTERVAL", "2"))  # seconds
+# How long DB-loaded values are trusted before re-reading them. With the
+# in-memory backend under several gunicorn workers this is how quickly one
+# worker sees another worker's flushed changes.
+REFRESH_SECONDS = float(os.getenv("LIVE_STATE_REFRESH_SECONDS", "30"))
+
+
+def _empty_pending():
+    # "flags"/"delta"/"reset" apply to every assignment row of the student;
+    # "rows" holds changes for one row: {instructor_id: {"flags", "delta"}}
+    return {"flags": {}, "delta": 0, "reset": False, "rows": {}}
+
+
+def _op(flags=None, incr=0, reset_count=False, instructor_id=None):
+    """One write as a pending-change record."""
+    p = _empty_pending()
+    if instructor_id is None:
+        p.update(flags=dict(flags or {}), delta=incr, reset=reset_count)
+    else:
+        p["rows"][int(instructor_id)] = {"flags": dict(flags or {}), "delta": incr}
+    return p
+
+
+def _combine(older, newer):
+    """
+    Fold `newer` on top of `older` as if they had been applied in order:
+    newer flags win, deltas add up, and a newer reset discards every count
+    change that came before it.
+    """
+    reset = newer["reset"]
+    rows = {}
+    for iid in set(older["rows"]) | set(newer["rows"]):
+        o = older["rows"].get(iid) or {"flags": {}, "delta": 0}
+        n = newer["rows"].get(iid) or {"flags": {}, "delta": 0}
+        # a newer student-wide flag overrides an older per-row one
+        row_flags = {k: v for k, v in o["flags"].items() if k not in newer["flags"]}
+        row_flags.update(n["flags"])
+        rows[iid] = {"flags": row_flags, "delta": (0 if reset else o["delta"]) + n["delta"]}
+    return {
+        "flags": {**older["flags"], **newer["flags"]},
+        "delta": newer["delta"] if reset else older["delta"] + newer["delta"],
+        "reset": reset or older["reset"],
+        "rows": rows,
+    }
+
+
+def _apply_rows(rows, pending):
+    """Assignment rows (as loaded from MySQL) with pending changes applied."""
+    out = []
+    for row in rows:
+        row = dict(row)
+        row.update(pending["flags"])
+        count = 0 if pending["reset"] else int(row.get(COUNT_FIELD) or 0)
+        row[COUNT_FIELD] = count + pending["delta"]
+        scoped = pending["rows"].get(row["instructor_id"])
+        if scoped:
+            row.update(scoped["flags"])
+            row[COUNT_FIELD] += scoped["delta"]
+        out.append(row)
+    return out
+
+
+def _merge_view(rows, pending):
+    """Student view = MAX over the student's assignment rows, as the monitor query did."""
+    rows = _apply_rows(rows, pending)
+    return {
+        field: max(int(r.get(field) or 0) for r in rows)
+        for field in (*FLAG_FIELDS, COUNT_FIELD)
+    }
+
+
+# -------------------------------------------------------------
+# Backends
+# -------------------------------------------------------------
+class InMemoryLiveStateBackend:
+    """Per-process dictionaries guarded by one lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._base = {}       # student_id -> {"state": [assignment rows] or None, "loaded_at": float}
+        self._pending = {}    # student_id -> pending-change record (see _empty_pending)
+
+    def apply(self, student_id, op):
+        with self._lock:
+            self._pending[student_id] = _combine(self._pending.get(student_id) or _empty_pending(), op)
+
+    def restore(self, student_id, pending):
+        """Put back a batch that failed to flush, underneath anything newer."""
+        with self._lock:
+            newer = self._pending.get(student_id) or _empty_pending()
+            self._pending[student_id] = _combine(pending, newer)
+            # the base already had this batch folded in; re-read it from MySQL
+            entry = self._base.get(student_id)
+            if entry:
+                entry["loaded_at"] = 0
+
+    def get(self, student_ids):
+        """Return {student_id: (base_entry or None, pending)}."""
+        with self._lock:
+            return {
+                sid: (self._base.get(sid), self._pending.get(sid) or _empty_pending())
+                for sid in student_ids
+            }
+
+    def set_base(self, states, loaded_at):
+        with self._lock:
+            for sid, state in states.items():
+                self._base[sid] = {"state": state, "loaded_at": loaded_at}
+
+    def take_dirty(self):
+        """Pop every pending change and fold it into the cached base."""
+        with self._lock:
+            dirty, self._pending = self._pending, {}
+            for sid, p in dirty.items():
+                entry = self._base.get(sid)
+                if entry and entry["state"] is not None:
+                    entry["state"] = _apply_rows(entry["state"], p)
+            return dirty
+
+
+class RedisLiveStateBackend:
+    """
+    Shared backend so every worker (and node) sees the same live state.
+    Per student: a hash with the DB base, and a list of pending ops that is
+    folded with _combine on read and popped atomically on flush.
+    """
+
+    PREFIX = "proctorvision:live:"
+    PENDING = "proctorvision:live:pending:"
+    DIRTY = "proctorvision:live:dirty"
+
+    def __init__(self, url=LIVE_STATE_REDIS_URL):
+        if redis is None:
+            raise RuntimeError("LIVE_STATE_BACKEND=redis requires the 'redis' package")
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+
+    def _key(self, sid):
+        return f"{self.PREFIX}{sid}"
+
+    def _pending_key(self, sid):
+        return f"{self.PENDING}{sid}"
+
+    @staticmethod
+    def _dump(pending):
+        return json.dumps(pending)
+
+    @staticmethod
+    def _fold(raw_ops):
+        pending = _empty_pending()
+        for raw in raw_ops:
+            op = json.loads(raw)
+            op["rows"] = {int(k): v for k, v in op["rows"].items()}   # JSON keys are strings
+            pending = _combine(pending, op)
+        return pending
+
+    def apply(self, student_id, op):
+        pipe = self._r.pipeline()
+        pipe.rpush(self._pending_key(student_id), self._dump(op))
+        pipe.sadd(self.DIRTY, student_id)
+        pipe.execute()
+
+    def restore(self, student_id, pending):
+        pipe = self._r.pipeline()
+        pipe.lpush(self._pending_key(student_id), self._dump(pending))   # older than anything queued since
+        pipe.sadd(self.DIRTY, student_id)
+        pipe.hset(self._key(student_id), "loaded_at", 0)
+        pipe.execute()
+
+    @staticmethod
+    def _decode_base(raw):
+        if raw.get("base") is None:
+            return None
+        state = json.loads(raw["base"])
+        if state is not None and not isinstance(state, list):
+            return None     # written by an older release; reload from MySQL
+        return {"state": state, "loaded_at": float(raw.get("loaded_at", 0))}
+
+    def get(self, student_ids):
+        pipe = self._r.pipeline()
+        for sid in student_ids:
+            pipe.hgetall(self._key(sid))
+            pipe.lrange(self._pending_key(sid), 0, -1)
+        results = pipe.execute()
+        return {
+            sid: (self._decode_base(results[2 * i]), self._fold(results[2 * i + 1]))
+            for i, sid in enumerate(student_ids)
+        }
+
+    def set_base(self, states, loaded_at):
+        pipe = self._r.pipeline()
+        for sid, state in states.items():
+            pipe.hset(self._key(sid), mapping={"base": json.dumps(state), "loaded_at": loaded_at})
+        pipe.execute()
+
+    def take_dirty(self):
+        dirty = {}
+        for sid in self._r.smembers(self.DIRTY):
+            pipe = self._r.pipeline(transaction=True)
+            pipe.lrange(self._pending_key(sid), 0, -1)
+            pipe.delete(self._pending_key(sid))
+            pipe.srem(self.DIRTY, sid)
+            pipe.hgetall(self._key(sid))
+            raw_ops, _, _, raw_base = pipe.execute()
+            pending = self._fold(raw_ops)
+            entry = self._decode_base(raw_base)
+            if entry and entry["state"] is not None:
+                self._r.hset(self._key(sid), "base", json.dumps(_apply_rows(entry["state"], pending)))
+            dirty[int(sid)] = pending
+        return dirty
+
+
+# -------------------------------------------------------------
+# Store
+# -------------------------------------------------------------
+class LiveStateStore:
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+
+    # ---- change notifications (this process only) ----
+    def subscribe(self, maxsize=1000):
+        """Return a queue that receives the id of every student whose state changes."""
+        q = queue.Queue(maxsize=maxsize)
+        with self._subscribers_lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._subscribers_lock:
+            self._subscribers.discard(q)
+
+    def _notify(self, student_id):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(student_id)
+            except queue.Full:
+                pass  # slow consumer; its periodic resync will catch up
+
+    # ---- writes (no DB round-trip) ----
+    # Without instructor_id, flags apply to every assignment row of the
+    # student (exam start/submit/logout); with it, only to that row.
+    def set_flags(self, student_id, instructor_id=None, **flags):
+        self._ensure_flusher()
+        flags = {k: int(bool(v)) for k, v in flags.items()}
+        self.backend.apply(int(student_id), _op(flags=flags, instructor_id=instructor_id))
+        self._notify(int(student_id))
+
+    def increment_suspicious(self, student_id, n=1, instructor_id=None):
+        """Bump one assignment row: the given instructor's, else the student's latest."""
+        self._ensure_flusher()
+        student_id = int(student_id)
+        if instructor_id is None:
+            instructor_id = get_instructor_id_for_student(student_id)
+            if instructor_id is None:
+                return      # no assignment, nothing to count against
+        self.backend.apply(student_id, _op(incr=int(n), instructor_id=instructor_id))
+        self._notify(student_id)
+
+    def reset_exam(self, student_id, **flags):
+        """Zero the suspicious counter (and set any flags) when an exam ends."""
+        self._ensure_flusher()
+        flags = {k: int(bool(v)) for k, v in flags.items()}
+        self.backend.apply(int(student_id), _op(flags=flags, reset_count=True))
+        self._notify(int(student_id))
+
+    # ---- reads ----
+    def get_states(self, student_ids):
+        """
+        Return {student_id: state dict} for students that have an instructor
+        assignment. Students not cached (or cached longer than
+        REFRESH_SECONDS) are loaded from MySQL in one grouped query.
+        """
+        student_ids = [int(s) for s in student_ids]
+        if not student_ids:
+            return {}
+        cached = self.backend.get(student_ids)
+        now = time.time()
+        stale = [
+            sid for sid, (entry, _) in cached.items()
+            if entry is None or now - entry["loaded_at"] > REFRESH_SECONDS
+        ]
+        if stale:
+            loaded = _load_states(stale)
+            self.backend.set_base(loaded, now)
+            for sid in stale:
+                cached[sid] = ({"state": loaded[sid], "loaded_at": now}, cached[sid][1])
+
+        return {
+            sid: _merge_view(entry["state"], pending)
+            for sid, (entry, pending) in cached.items()
+            if entry and entry["state"] is not None
+        }
+
+    # ---- flushing ----
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="live-state-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write every coalesced change to instructor_assignments in one transaction."""
+        dirty = self.backend.take_dirty()
+        if not dirty:
+            return 0
+        try:
+            _write_states(dirty)
+            return len(dirty)
+        except Exception as e:
+            print(f"[LIVE_STATE_FLUSH_ERR] {e}; re-queueing {len(dirty)} students", file=sys.stderr, flush=True)
+            for sid, p in dirty.items():
+                self.backend.restore(sid, p)
+            return 0
+
+    def shutdown(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=timeout)
+        self.flush()
+
+
+def _load_states(student_ids):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(student_ids))
+        cursor.execute(f"""
+            SELECT student_id, instructor_id, is_login, is_taking_exam, is_other_tab, suspicious_behavior_count
+            FROM instructor_assignments
+            WHERE student_id IN ({placeholders})
+        """, student_ids)
+        rows = {}
+        for r in cursor.fetchall():
+            sid = r.pop("student_id")
+            rows.setdefault(sid, []).append({k: int(v or 0) for k, v in r.items()})
+        # None marks "no instructor assignment" so we don't keep re-querying it
+        return {sid: rows.get(sid) for sid in student_ids}
+    finally:
+        conn.close()
+
+
+def _set_clauses(flags, delta, reset):
+    sets, params = [], []
+    for field in FLAG_FIELDS:
+        if field in flags:
+            sets.append(f"{field} = %s")
+            params.append(flags[field])
+    if reset:
+        sets.append(f"{COUNT_FIELD} = %s")
+        params.append(delta)
+    elif delta:
+        sets.append(f"{COUNT_FIELD} = {COUNT_FIELD} + %s")
+        params.append(delta)
+    return sets, params
+
+
+def _write_states(dirty):
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor()
+        for sid, p in dirty.items():
+            # student-wide changes first, then the per-assignment ones on top
+            sets, params = _set_clauses(p["flags"], p["delta"], p["reset"])
+            if sets:
+                cur.execute(
+                    f"UPDATE instructor_assignments SET {', '.join(sets)} WHERE student_id = %s",
+                    (*params, sid),
+                )
+            for iid, row in p["rows"].items():
+                sets, params = _set_clauses(row["flags"], row["delta"], False)
+                if sets:
+                    cur.execute(
+                        f"UPDATE instructor_assignments SET {', '.join(sets)} "
+                        "WHERE student_id = %s AND instructor_id = %s",
+                        (*params, sid, iid),
+                    )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+def _make_backend():
+    if LIVE_STATE_BACKEND == "redis":
+        return RedisLiveStateBackend()
+    return InMemoryLiveStateBackend()
+
+
+live_state = LiveStateStore(_make_backend())
+atexit.register(live_state.shutdown)
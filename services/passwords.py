@@ -0,0 +1,161 @@
+# services/passwords.py
+# bcrypt hashing with a configurable work factor, and a bounded verification
+# pool so a login burst queues (and is measured) instead of pinning every
+# request worker on checkpw.
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from database.connection import get_db_connection
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", str(os.cpu_count() or 2)))
+VERIFY_QUEUE_MAX = int(os.getenv("PASSWORD_VERIFY_QUEUE_MAX", "256"))     # waiting checks
+VERIFY_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_VERIFY_QUEUE_TIMEOUT", "10"))
+
+
+class VerifierBusy(Exception):
+    """The verification queue stayed full for VERIFY_QUEUE_TIMEOUT seconds."""
+
+
+def hash_password(raw_password, rounds=None):
+    return bcrypt.hashpw(raw_password.encode("utf-8"), bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
+
+
+def hash_cost(stored_hash):
+    """Work factor of a '$2b$12$...' hash, or None if it isn't one."""
+    try:
+        return int(str(stored_hash).split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(stored_hash):
+    return hash_cost(stored_hash) != BCRYPT_ROUNDS
+
+
+def check_password(raw_password, stored_hash):
+    try:
+        return bcrypt.checkpw(raw_password.encode("utf-8"), str(stored_hash).strip().encode("utf-8"))
+    except ValueError:       # malformed stored hash
+        return False
+
+
+class PasswordVerifier:
+    """
+    bcrypt releases the GIL, so a small thread pool gives real parallelism.
+    At most `workers + queue_max` checks are admitted; callers beyond that
+    wait up to `queue_timeout` (or not at all with wait=False) and then get
+    VerifierBusy.
+    """
+
+    def __init__(self, workers=VERIFY_WORKERS, queue_max=VERIFY_QUEUE_MAX, queue_timeout=VERIFY_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_max)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # metrics
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.running = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pw-verify")
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, args, queued_at):
+        started = time.monotonic()
+        with self._lock:
+            self.running += 1
+            wait = started - queued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_run += time.monotonic() - started
+            self._slots.release()
+
+    def submit(self, fn, *args, wait=True):
+        if not self._slots.acquire(timeout=self.queue_timeout if wait else 0):
+            with self._lock:
+                self.rejected += 1
+            raise VerifierBusy()
+        with self._lock:
+            self.submitted += 1
+        try:
+            return self._pool().submit(self._run, fn, args, time.monotonic())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def verify(self, raw_password, stored_hash):
+        """Blocking check on the pool."""
+        return self.submit(check_password, raw_password, stored_hash).result()
+
+    def stats(self):
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "running": self.running,
+                "queued": self.submitted - self.completed - self.running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / done * 1000, 1),
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "avg_run_ms": round(self.total_run / done * 1000, 1),
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+
+password_verifier = PasswordVerifier()
+
+
+def _store_rehash(table, key_column, key, raw_password, old_hash):
+    new_hash = hash_password(raw_password)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # only replace the hash that was verified; a password change made
+        # while this was queued must win
+        cursor.execute(
+            f"UPDATE {table} SET password = %s WHERE {key_column} = %s AND password = %s",
+            (new_hash, key, old_hash),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def rehash_in_background(table, key_column, key, raw_password, old_hash):
+    """
+    Upgrade a stored hash to BCRYPT_ROUNDS after a successful login.
+    old_hash is the stored value exactly as read for the check.
+    """
+    def run():
+        try:
+            _store_rehash(table, key_column, key, raw_password, old_hash)
+        except Exception as e:
+            print(f"[REHASH_ERR] {table}.{key_column}={key}: {e}", file=sys.stderr, flush=True)
+    try:
+        password_verifier.submit(run, wait=False)
+    except VerifierBusy:
+        pass    # try again on the next login
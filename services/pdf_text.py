@@ -0,0 +1,28 @@
+# services/pdf_text.py
+# Exam PDF text extraction, cached per file version (path + mtime + size).
+import os
+import fitz  # PyMuPDF
+from services.cache import SingleFlight, TTLCache, cached_single_flight
+
+PDF_TEXT_TTL = float(os.getenv("PDF_TEXT_TTL", "3600"))   # seconds
+PDF_TEXT_CACHE_SIZE = int(os.getenv("PDF_TEXT_CACHE_SIZE", "64"))
+
+_texts = TTLCache(ttl=PDF_TEXT_TTL, maxsize=PDF_TEXT_CACHE_SIZE)
+_flight = SingleFlight("pdf_text")
+
+
+def _extract(pdf_path):
+    text = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            page_text = page.get_text("text").strip()
+            if page_text:
+                text.append(page_text)
+    return "\n\n".join(text)
+
+
+def extract_pdf_text(pdf_path):
+    """Plain text of a PDF; re-extracted only when the file changes on disk."""
+    st = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), st.st_mtime_ns, st.st_size)
+    return cached_single_flight(_texts, _flight, key, lambda: _extract(pdf_path))
@@ -0,0 +1,105 @@
+# services/prewarm.py
+# Loads exams into this worker's caches shortly before their start_time so
+# the first wave of students never takes a cold path.
+import os
+import sys
+import threading
+import time
+from database.connection import get_db_connection
+from services.exam_content import prime_exam
+from services.instructor_services import prime_instructor_mappings
+from services.live_state import live_state
+from services.pdf_text import extract_pdf_text
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1") == "1"
+PREWARM_LEAD_MINUTES = int(os.getenv("PREWARM_LEAD_MINUTES", "10"))
+PREWARM_POLL_SECONDS = float(os.getenv("PREWARM_POLL_SECONDS", "60"))
+# Keep warmed entries this long past start_time (covers late joiners)
+PREWARM_HOLD_AFTER_START = float(os.getenv("PREWARM_HOLD_AFTER_START", "600"))
+
+
+def _upcoming_exams(lead_minutes):
+    """Exams whose start falls within the next `lead_minutes` (DB clock)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT id, exam_file,
+                   TIMESTAMPDIFF(SECOND, NOW(), TIMESTAMP(exam_date, start_time)) AS starts_in
+            FROM exams
+            WHERE exam_date BETWEEN CURDATE() AND CURDATE() + INTERVAL 1 DAY
+              AND start_time IS NOT NULL
+              AND TIMESTAMP(exam_date, start_time) BETWEEN NOW() AND NOW() + INTERVAL %s MINUTE
+        """, (lead_minutes,))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def warm_exam(exam_id, exam_file=None, starts_in=0):
+    hold = max(int(starts_in or 0), 0) + PREWARM_HOLD_AFTER_START
+    roster = prime_exam(exam_id, hold)
+    student_ids = [s["student_id"] for s in roster]
+    if student_ids:
+        prime_instructor_mappings(student_ids, ttl=hold)
+        live_state.get_states(student_ids)
+    if exam_file and exam_file.lower().endswith(".pdf"):
+        pdf_path = os.path.join(os.getcwd(), exam_file)
+        if os.path.isfile(pdf_path):
+            extract_pdf_text(pdf_path)
+    return len(student_ids)
+
+
+class PrewarmScheduler:
+    def __init__(self, lead_minutes=PREWARM_LEAD_MINUTES, poll_seconds=PREWARM_POLL_SECONDS):
+        self.lead_minutes = lead_minutes
+        self.poll_seconds = poll_seconds
+        self._warmed = {}     # exam_id -> monotonic time it stops mattering
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        # Per pid, like the other background workers: each gunicorn worker warms its own caches
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="exam-prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while True:
+            self.tick()
+            if self._stopping.wait(self.poll_seconds):
+                return
+
+    def tick(self):
+        now = time.monotonic()
+        self._warmed = {k: until for k, until in self._warmed.items() if until > now}
+        try:
+            exams = _upcoming_exams(self.lead_minutes)
+        except Exception as e:
+            print(f"[PREWARM_ERR] listing upcoming exams: {e}", file=sys.stderr, flush=True)
+            return 0
+
+        warmed = 0
+        for exam in exams:
+            if exam["id"] in self._warmed:
+                continue
+            try:
+                students = warm_exam(exam["id"], exam.get("exam_file"), exam.get("starts_in"))
+                self._warmed[exam["id"]] = now + (exam.get("starts_in") or 0) + PREWARM_HOLD_AFTER_START
+                warmed += 1
+                print(f"[PREWARM] exam {exam['id']} ready ({students} students, starts in {exam.get('starts_in')}s)", flush=True)
+            except Exception as e:
+                print(f"[PREWARM_ERR] exam {exam['id']}: {e}", file=sys.stderr, flush=True)
+        return warmed
+
+
+prewarm_scheduler = PrewarmScheduler()
@@ -0,0 +1,223 @@
+# services/refresh_tokens.py
+# Rotating, revocable refresh tokens. Only a SHA-256 of each token's jti is
+# stored; every refresh retires the presented token and issues its successor
+# in the same family. Presenting a retired token revokes the whole family,
+# unless it was rotated within REFRESH_REUSE_GRACE_SECONDS (parallel tabs or
+# a retried request racing the same rotation).
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_refresh_token, decode_token
+from database.connection import get_db_connection
+
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "7"))
+REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30"))
+PURGE_INTERVAL = int(os.getenv("REFRESH_PURGE_INTERVAL_SECONDS", "3600"))   # per worker
+PURGE_RETENTION_DAYS = int(os.getenv("REFRESH_PURGE_RETENTION_DAYS", "1"))
+PURGE_BATCH = 1000
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+class RefreshTokenError(Exception):
+    """Unknown, expired, revoked or reused refresh token."""
+
+
+def _hash_jti(jti):
+    return hashlib.sha256(jti.encode("utf-8")).hexdigest()
+
+
+def _issue(cursor, account_type, account_id, username, family_id):
+    expires = timedelta(days=REFRESH_TOKEN_DAYS)
+    token = create_refresh_token(identity=username, expires_delta=expires)
+    jti = decode_token(token)["jti"]
+    cursor.execute("""
+        INSERT INTO refresh_tokens (token_hash, family_id, account_type, account_id, expires_at)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (_hash_jti(jti), family_id, account_type, account_id, datetime.now() + expires))
+    return token, _hash_jti(jti)
+
+
+def issue_refresh_token(account_type, account_id, username):
+    """Start a new token family at login. account_type is 'admin' or 'users'."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        token, _ = _issue(cursor, account_type, account_id, username, uuid.uuid4().hex)
+        conn.commit()
+    finally:
+        conn.close()
+    _maybe_purge()
+    return token
+
+
+def _revoke_family(cursor, family_id):
+    cursor.execute("""
+        UPDATE refresh_tokens SET revoked_at = NOW()
+        WHERE family_id = %s AND revoked_at IS NULL
+    """, (family_id,))
+
+
+def _in_grace(cursor, family_id, revoked_at):
+    """
+    Rotated moments ago, and the family still has a live token (no logout since).
+    Runs after the FOR UPDATE in rotate_refresh_token, so its consistent read
+    starts after any concurrent rotation of the same token has committed.
+    """
+    if revoked_at is None or revoked_at <= datetime.now() - timedelta(seconds=REUSE_GRACE_SECONDS):
+        return False
+    cursor.execute("""
+        SELECT 1 FROM refresh_tokens
+        WHERE family_id = %s AND revoked_at IS NULL AND expires_at > NOW()
+        LIMIT 1
+    """, (family_id,))
+    return cursor.fetchone() is not None
+
+
+def rotate_refresh_token(jti):
+    """
+    Retire the presented token and issue its successor.
+    Returns (account row, new refresh token); raises RefreshTokenError.
+
+    A token rotated less than REUSE_GRACE_SECONDS ago gets another token in
+    the same family instead of revoking it. Only the successor's hash is
+    stored, so the successor itself can't be handed back; the extra token
+    expires with the family or is revoked with it.
+    """
+    token_hash = _hash_jti(jti)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # token + current account details in one indexed lookup. The token row
+        # is locked, so a concurrent refresh of the same token waits here and
+        # then sees it rotated (grace path below) instead of racing the UPDATE.
+        cursor.execute("""
+            SELECT rt.id, rt.family_id, rt.account_type, rt.account_id,
+                   rt.expires_at, rt.revoked_at, rt.replaced_by,
+                   COALESCE(u.username, a.username) AS username,
+                   COALESCE(u.name, a.name) AS name,
+                   IF(rt.account_type = 'admin', 'Admin', u.user_type) AS user_type
+            FROM refresh_tokens rt
+            LEFT JOIN users u ON rt.account_type = 'users' AND u.id = rt.account_id
+            LEFT JOIN admin a ON rt.account_type = 'admin' AND a.id = rt.account_id
+            WHERE rt.token_hash = %s
+            FOR UPDATE
+        """, (token_hash,))
+        row = cursor.fetchone()
+
+        if not row or row["username"] is None:
+            raise RefreshTokenError("Unknown refresh token")
+        if row["expires_at"] <= datetime.now():
+            raise RefreshTokenError("Refresh token expired")
+        if row["revoked_at"] is not None:
+            if row["replaced_by"] is not None and _in_grace(cursor, row["family_id"], row["revoked_at"]):
+                new_token, _ = _issue(
+                    cursor, row["account_type"], row["account_id"], row["username"], row["family_id"]
+                )
+                conn.commit()
+                return row, new_token
+            if row["replaced_by"] is not None:
+                # an already-rotated token came back: assume it was stolen
+                _revoke_family(cursor, row["family_id"])
+                conn.commit()
+                print(f"[REFRESH_REUSE] family {row['family_id']} revoked", flush=True)
+            raise RefreshTokenError("Refresh token revoked")
+
+        new_token, new_hash = _issue(
+            cursor, row["account_type"], row["account_id"], row["username"], row["family_id"]
+        )
+        cursor.execute("""
+            UPDATE refresh_tokens SET revoked_at = NOW(), replaced_by = %s
+            WHERE id = %s AND revoked_at IS NULL
+        """, (new_hash, row["id"]))
+        if cursor.rowcount != 1:     # row is locked above; kept as a safety net
+            conn.rollback()
+            raise RefreshTokenError("Refresh token revoked")
+
+        conn.commit()
+        return row, new_token
+    except RefreshTokenError:
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def revoke_refresh_token(jti):
+    """Logout: revoke the family the presented token belongs to."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT family_id FROM refresh_tokens WHERE token_hash = %s", (_hash_jti(jti),))
+        row = cursor.fetchone()
+        if row:
+            _revoke_family(cursor, row[0])
+            conn.commit()
+        return bool(row)
+    finally:
+        conn.close()
+
+
+def delete_account_tokens(cursor, account_type, account_id):
+    """Drop every refresh token of an account (caller commits)."""
+    cursor.execute(
+        "DELETE FROM refresh_tokens WHERE account_type = %s AND account_id = %s",
+        (account_type, account_id),
+    )
+
+
+# -------------------------------------------------------------
+# Cleanup
+# -------------------------------------------------------------
+def purge_refresh_tokens():
+    """
+    Delete tokens that expired, and revoked tokens that were not rotated
+    (logout / family revocation), more than PURGE_RETENTION_DAYS ago.
+    Rotated tokens are kept until they expire so reuse is still detected.
+    Deletes in batches; returns the number of rows removed.
+    """
+    removed = 0
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("""
+                DELETE FROM refresh_tokens
+                WHERE expires_at < NOW() - INTERVAL %s DAY
+                   OR (revoked_at < NOW() - INTERVAL %s DAY AND replaced_by IS NULL)
+                LIMIT %s
+            """, (PURGE_RETENTION_DAYS, PURGE_RETENTION_DAYS, PURGE_BATCH))
+            conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < PURGE_BATCH:
+                return removed
+    finally:
+        conn.close()
+
+
+def _maybe_purge():
+    """Run purge_refresh_tokens at most once per PURGE_INTERVAL in this worker."""
+    global _last_purge
+    if PURGE_INTERVAL <= 0:
+        return
+    with _purge_lock:
+        now = time.monotonic()
+        if _last_purge and now - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = now
+
+    def run():
+        try:
+            removed = purge_refresh_tokens()
+            if removed:
+                print(f"[REFRESH_PURGE] removed {removed} rows", flush=True)
+        except Exception as e:
+            print(f"[REFRESH_PURGE_ERR] {e}", file=sys.stderr, flush=True)
+    threading.Thread(target=run, name="refresh-token-purge", daemon=True).start()
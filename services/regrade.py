@@ -0,0 +1,155 @@
+# services/regrade.py
+# Recompute exam_answers.is_correct and exam_submissions.score for a whole
+# exam against its current answer key, vectorized with pandas, writing back
+# only the rows that changed.
+import time
+import pandas as pd
+from database.connection import get_db_connection
+from services.exam_content import invalidate_exam_content
+from services.grading import get_answer_key
+
+WRITE_CHUNK = 1000
+AUTO_GRADED = ("mcq", "identification")
+
+
+def _key_frames(key):
+    questions = pd.DataFrame(
+        [(q.id, q.type, q.normalized) for q in key.questions],
+        columns=["question_id", "question_type", "correct_normalized"],
+    )
+    options = pd.DataFrame(
+        [
+            (q.id, option_id, bool(ok))
+            for q in key.questions if q.type == "mcq"
+            for option_id, (_, ok) in q.options.items()
+        ],
+        columns=["question_id", "selected_option_id", "option_correct"],
+    )
+    options["selected_option_id"] = options["selected_option_id"].astype("Int64")
+    return questions, options
+
+
+def _normalize(texts):
+    """Vectorized services.grading.normalize_answer."""
+    return (
+        texts.fillna("").astype(str)
+        .str.strip()
+        .str.replace(r"\s+", " ", regex=True)
+        .str.casefold()
+    )
+
+
+def compute_regrade(key, answers, submissions):
+    """
+    answers: submission_id, question_id, selected_option_id, selected_text, is_correct
+    submissions: id, score, total_score
+    Returns (changed answers frame, changed submissions frame).
+    """
+    questions, options = _key_frames(key)
+
+    df = answers.copy()
+    df["selected_option_id"] = pd.to_numeric(df["selected_option_id"], errors="coerce").astype("Int64")
+    df["is_correct"] = pd.to_numeric(df["is_correct"], errors="coerce").astype("Int64")
+    df = df.merge(questions, on="question_id", how="inner")
+    df = df.merge(options, on=["question_id", "selected_option_id"], how="left")
+
+    mcq = df["question_type"].eq("mcq")
+    ident = df["question_type"].eq("identification")
+    ident_ok = df["correct_normalized"].notna() & _normalize(df["selected_text"]).eq(df["correct_normalized"])
+
+    new = df["is_correct"].copy()            # essays keep whatever they had
+    new[mcq] = df.loc[mcq, "option_correct"].fillna(False).astype(int)
+    new[ident] = ident_ok[ident].astype(int)
+    df["new_is_correct"] = new.astype("Int64")
+
+    changed_answers = df[df["new_is_correct"].fillna(-1) != df["is_correct"].fillna(-1)]
+
+    auto = df[mcq | ident]
+    scores = auto.groupby("submission_id")["new_is_correct"].sum().rename("new_score")
+    subs = submissions.merge(scores, left_on="id", right_index=True, how="left")
+    subs["new_score"] = subs["new_score"].fillna(0).astype(int)
+    subs["new_total"] = key.total
+    changed_subs = subs[(subs["new_score"] != subs["score"]) | (subs["new_total"] != subs["total_score"])]
+
+    return (
+        changed_answers[["submission_id", "question_id", "new_is_correct"]],
+        changed_subs[["id", "new_score", "new_total"]],
+    )
+
+
+def _load_frames(cursor, exam_id):
+    cursor.execute("""
+        SELECT ea.submission_id, ea.question_id, ea.selected_option_id, ea.selected_text, ea.is_correct
+        FROM exam_answers ea
+        JOIN exam_submissions s ON s.id = ea.submission_id
+        WHERE s.exam_id = %s
+    """, (exam_id,))
+    answers = pd.DataFrame.from_records(
+        cursor.fetchall(),
+        columns=["submission_id", "question_id", "selected_option_id", "selected_text", "is_correct"],
+    )
+    cursor.execute("SELECT id, score, total_score FROM exam_submissions WHERE exam_id = %s", (exam_id,))
+    submissions = pd.DataFrame.from_records(cursor.fetchall(), columns=["id", "score", "total_score"])
+    return answers, submissions
+
+
+def _write_answers(cursor, changed):
+    for value in (0, 1):
+        pairs = changed.loc[changed["new_is_correct"] == value, ["submission_id", "question_id"]]
+        pairs = [(int(s), int(q)) for s, q in pairs.itertuples(index=False)]
+        for start in range(0, len(pairs), WRITE_CHUNK):
+            chunk = pairs[start:start + WRITE_CHUNK]
+            placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(
+                f"UPDATE exam_answers SET is_correct = %s WHERE (submission_id, question_id) IN ({placeholders})",
+                (value, *[v for pair in chunk for v in pair]),
+            )
+
+
+def _write_scores(cursor, changed):
+    rows = [(int(i), int(s), int(t)) for i, s, t in changed.itertuples(index=False)]
+    for start in range(0, len(rows), WRITE_CHUNK):
+        chunk = rows[start:start + WRITE_CHUNK]
+        derived = " UNION ALL ".join(["SELECT %s AS id, %s AS score, %s AS total_score"] * len(chunk))
+        cursor.execute(f"""
+            UPDATE exam_submissions s
+            JOIN ({derived}) v ON v.id = s.id
+            SET s.score = v.score, s.total_score = v.total_score
+        """, [v for row in chunk for v in row])
+
+
+def regrade_exam(exam_id, dry_run=False):
+    """Regrade every submission of an exam. Returns a summary dict."""
+    started = time.monotonic()
+    exam_id = int(exam_id)
+    invalidate_exam_content(exam_id)         # always grade against the latest key
+    key = get_answer_key(exam_id)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        answers, submissions = _load_frames(cursor, exam_id)
+        if key.total == 0 or submissions.empty:
+            changed_answers, changed_subs = answers.iloc[0:0], submissions.iloc[0:0]
+        else:
+            changed_answers, changed_subs = compute_regrade(key, answers, submissions)
+
+        if not dry_run:
+            _write_answers(cursor, changed_answers)
+            _write_scores(cursor, changed_subs)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "exam_id": exam_id,
+        "submissions": len(submissions),
+        "answers_checked": len(answers),
+        "answers_changed": len(changed_answers),
+        "scores_changed": len(changed_subs),
+        "dry_run": bool(dry_run),
+        "seconds": round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,91 @@
+# services/roster_import.py
+# CSV/XLSX student rosters: read into a DataFrame, normalize and validate in
+# vectorized form, and hand the valid rows to services/account_service.py.
+import os
+import pandas as pd
+from services.account_service import existing_usernames_emails
+
+REQUIRED_COLUMNS = ["name", "username", "email", "password"]
+
+# header spellings seen in exported class lists -> canonical column
+COLUMN_ALIASES = {
+    "full_name": "name",
+    "student_name": "name",
+    "user_name": "username",
+    "student_id": "username",
+    "e-mail": "email",
+    "email_address": "email",
+}
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+
+def read_roster(stream, filename):
+    """Load an uploaded .csv/.xlsx as an all-string DataFrame."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        df = pd.read_csv(stream, dtype=str, keep_default_na=False, skipinitialspace=True)
+    elif ext == ".xlsx":
+        df = pd.read_excel(stream, dtype=str, keep_default_na=False)
+    else:
+        raise ValueError("Unsupported file type. Please upload a .CSV or .XLSX file.")
+
+    df.columns = [
+        COLUMN_ALIASES.get(c, c)
+        for c in (str(c).strip().lower().replace(" ", "_") for c in df.columns)
+    ]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    df = df[REQUIRED_COLUMNS].fillna("").astype(str)
+    for c in REQUIRED_COLUMNS:
+        df[c] = df[c].str.strip()
+    df["email"] = df["email"].str.lower()
+    # spreadsheet row numbers (header is row 1)
+    df.index = pd.RangeIndex(2, len(df) + 2, name="row")
+    # drop fully blank trailing rows that Excel likes to keep
+    return df[(df != "").any(axis=1)]
+
+
+def validate_roster(cursor, df):
+    """
+    Returns (valid rows as a list of dicts, per-row error report).
+    Every check is a boolean mask over the whole frame.
+    """
+    checks = {}
+    for c in REQUIRED_COLUMNS:
+        checks[f"Missing {c}"] = df[c].eq("")
+
+    has_email = df["email"].ne("")
+    has_username = df["username"].ne("")
+    checks["Invalid email format"] = has_email & ~df["email"].str.match(EMAIL_PATTERN)
+    # users.username uses a case-insensitive collation, so compare lower-cased
+    username_key = df["username"].str.lower()
+    checks["Duplicate username in file"] = has_username & username_key.duplicated(keep="first")
+    checks["Duplicate email in file"] = has_email & df["email"].duplicated(keep="first")
+
+    taken_usernames, taken_emails = existing_usernames_emails(
+        cursor,
+        df.loc[has_username, "username"].unique().tolist(),
+        df.loc[has_email, "email"].unique().tolist(),
+    )
+    # existing_usernames_emails returns stripped, lower-cased values
+    checks["Username already exists"] = has_username & username_key.isin(taken_usernames)
+    checks["Email already exists"] = has_email & df["email"].str.lower().isin(taken_emails)
+
+    masks = pd.DataFrame(checks)
+    invalid = masks.any(axis=1)
+
+    report = []
+    if invalid.any():
+        failed = masks[invalid].stack()
+        messages = failed[failed].reset_index(level=1).iloc[:, 0].groupby(level=0).agg(list)
+        usernames = df.loc[messages.index, "username"]
+        report = [
+            {"row": int(row), "username": username, "errors": errors}
+            for row, username, errors in zip(messages.index, usernames, messages)
+        ]
+
+    valid = df[~invalid].to_dict("records")
+    return valid, report
@@ -0,0 +1,298 @@
+# services/submission_service.py
+# Exam submission processing, shared by the synchronous /submit_exam path and
+# the asynchronous pipeline (payload recorded durably in exam_submission_jobs,
+# graded by a worker pool, polled via /submission_status/<job_id>).
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from database.connection import get_db_connection
+from services.grading import get_answer_key, grade_answers, save_graded_submission
+
+SUBMIT_ASYNC_DEFAULT = os.getenv("SUBMIT_ASYNC_DEFAULT", "0") == "1"
+SUBMIT_WORKERS = int(os.getenv("SUBMIT_WORKERS", "4"))
+SUBMIT_POLL_SECONDS = float(os.getenv("SUBMIT_POLL_SECONDS", "5"))
+SUBMIT_LEASE_SECONDS = int(os.getenv("SUBMIT_LEASE_SECONDS", "60"))
+SUBMIT_MAX_ATTEMPTS = int(os.getenv("SUBMIT_MAX_ATTEMPTS", "3"))
+
+
+# -------------------------------------------------------------
+# Grading / persistence
+# -------------------------------------------------------------
+def validate_submission(data):
+    """Return an error message for a malformed payload, else None."""
+    if not data.get("user_id") or not data.get("exam_id"):
+        return "Missing user_id or exam_id"
+    if not isinstance(data.get("answers") or {}, dict) and not data.get("code"):
+        return "Invalid request body"
+    return None
+
+
+def process_submission(data):
+    """Record and grade one submission. Returns (response body, HTTP status)."""
+    user_id = data.get("user_id")
+    exam_id = data.get("exam_id")
+    answers = data.get("answers") or {}
+    language = data.get("language")        # for coding exam
+    code = data.get("code")                # student's source code
+    output = data.get("output") or ""      # last console output
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+
+        # Fetch exam details
+        cursor.execute("SELECT id, exam_category FROM exams WHERE id = %s", (exam_id,))
+        exam = cursor.fetchone()
+
+        if not exam:
+            return {"error": "Exam not found"}, 404
+
+        exam_category = exam.get("exam_category")  # QA or CODING
+        now = datetime.now()
+
+        # -------------------------------------------------------------------
+        # 🧩 Handle CODING Exams
+        # -------------------------------------------------------------------
+        if exam_category and exam_category.upper() == "CODING":
+            if not code or not language:
+                return {"error": "Missing code or language"}, 400
+
+            # Insert a submission entry in exam_submissions table
+            cursor.execute("""
+                INSERT INTO exam_submissions (user_id, exam_id, score, total_score, submitted_at)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    submitted_at = VALUES(submitted_at),
+                    id = LAST_INSERT_ID(id)
+            """, (user_id, exam_id, 0, 0, now))
+
+            # Save code submission details (✅ uses student_id)
+            cursor.execute("""
+                INSERT INTO coding_submissions (student_id, exam_id, language, code, output, submitted_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    code = VALUES(code),
+                    output = VALUES(output),
+                    submitted_at = VALUES(submitted_at)
+            """, (user_id, exam_id, language, code, output, now))
+
+            conn.commit()
+
+            return {
+                "message": "✅ Coding exam submitted successfully",
+                "exam_id": exam_id,
+                "language": language,
+                "category": "CODING"
+            }, 200
+
+        # -------------------------------------------------------------------
+        # 🧩 Handle QA Exams: graded against the cached answer key
+        # -------------------------------------------------------------------
+        key = get_answer_key(exam_id)
+        total_score = key.total
+        if total_score == 0:
+            return {"error": "No questions found"}, 400
+
+        score, rows, review = grade_answers(key, answers)
+        save_graded_submission(cursor, user_id, exam_id, score, total_score, rows, now)
+
+        conn.commit()
+
+        return {
+            "message": "Exam submitted successfully",
+            "score": score,
+            "total_score": total_score,
+            "answers": review
+        }, 200
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# -------------------------------------------------------------
+# Durable job records
+# -------------------------------------------------------------
+def default_idempotency_key(data):
+    """Identical payloads from the same student collapse to one job."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def enqueue_submission(data, idempotency_key):
+    """
+    Record the raw payload (once per student, exam and idempotency key) and
+    hand it to the worker pool. Returns (job row, created).
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            INSERT IGNORE INTO exam_submission_jobs (idempotency_key, user_id, exam_id, payload)
+            VALUES (%s, %s, %s, %s)
+        """, (idempotency_key, data["user_id"], data["exam_id"], json.dumps(data, default=str)))
+        created = cursor.rowcount == 1
+        # keys are client-supplied: only ever match this student's own job
+        cursor.execute("""
+            SELECT id, status, attempts
+            FROM exam_submission_jobs
+            WHERE user_id = %s AND exam_id = %s AND idempotency_key = %s
+        """, (data["user_id"], data["exam_id"], idempotency_key))
+        job = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    if created:
+        submission_workers.notify(job["id"])
+    return job, created
+
+
+def get_submission_job(job_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT id, user_id, exam_id, status, attempts, result, result_status, created_at, updated_at
+            FROM exam_submission_jobs
+            WHERE id = %s
+        """, (job_id,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def _claim_job(cursor, job_id):
+    """Take ownership of a queued (or abandoned) job; False if someone else has it."""
+    cursor.execute("""
+        UPDATE exam_submission_jobs
+        SET status = 'grading',
+            attempts = attempts + 1,
+            locked_until = NOW() + INTERVAL %s SECOND
+        WHERE id = %s
+          AND (status = 'queued' OR (status = 'grading' AND locked_until < NOW()))
+    """, (SUBMIT_LEASE_SECONDS, job_id))
+    return cursor.rowcount == 1
+
+
+def run_submission_job(job_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        if not _claim_job(cursor, job_id):
+            conn.commit()
+            return False
+        cursor.execute("SELECT payload, attempts FROM exam_submission_jobs WHERE id = %s", (job_id,))
+        job = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    try:
+        body, status_code = process_submission(json.loads(job["payload"]))
+        final = "done" if status_code < 400 else "failed"
+        _finish_job(job_id, final, body, status_code)
+    except Exception as e:
+        retry = job["attempts"] < SUBMIT_MAX_ATTEMPTS
+        print(f"[SUBMIT_JOB_ERR] job {job_id} attempt {job['attempts']}: {e}", file=sys.stderr, flush=True)
+        _finish_job(job_id, "queued" if retry else "failed", {"error": str(e)}, 500)
+        if retry:
+            submission_workers.notify(job_id)
+    return True
+
+
+def _finish_job(job_id, status, body, status_code):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE exam_submission_jobs
+            SET status = %s, result = %s, result_status = %s, locked_until = NULL
+            WHERE id = %s
+        """, (status, json.dumps(body, default=str), status_code, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _pending_job_ids(limit=100):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id FROM exam_submission_jobs
+            WHERE status = 'queued' OR (status = 'grading' AND locked_until < NOW())
+            ORDER BY id
+            LIMIT %s
+        """, (limit,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+# -------------------------------------------------------------
+# Worker pool
+# -------------------------------------------------------------
+class SubmissionWorkerPool:
+    """
+    Grading threads fed by an in-process queue of job ids. A poller also
+    sweeps the table so jobs from restarted or other workers still finish.
+    """
+
+    def __init__(self, workers=SUBMIT_WORKERS, poll_seconds=SUBMIT_POLL_SECONDS):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self.processed = 0
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"submission-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._poll, name="submission-poller", daemon=True))
+            for t in self._threads:
+                t.start()
+
+    def notify(self, job_id):
+        self.start()
+        self._queue.put(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                if run_submission_job(job_id):
+                    self.processed += 1
+            except Exception as e:
+                print(f"[SUBMIT_WORKER_ERR] job {job_id}: {e}", file=sys.stderr, flush=True)
+
+    def _poll(self):
+        while True:
+            try:
+                # only sweep when idle so the backlog isn't queued twice
+                if self._queue.empty():
+                    for job_id in _pending_job_ids():
+                        self._queue.put(job_id)
+            except Exception as e:
+                print(f"[SUBMIT_POLL_ERR] {e}", file=sys.stderr, flush=True)
+            time.sleep(self.poll_seconds)
+
+
+submission_workers = SubmissionWorkerPool()